@@ -0,0 +1,72 @@
+from collections import namedtuple
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+
+TOKEN_CACHE_KEY = 'auth:token:{key}'
+# Deleted tokens are evicted by a signal once the delete commits; the TTL
+# bounds how long other changes to the owner lag behind
+TOKEN_CACHE_TTL = getattr(settings, 'TOKEN_CACHE_TTL', 60)
+
+TokenOwner = namedtuple('TokenOwner', ['user_id', 'is_active', 'username', 'is_staff', 'is_superuser'])
+
+
+def _cache_key(key):
+    # Keys come straight from headers and cookies; real ones are 40 hex chars
+    if not key or len(key) > 40 or not key.isalnum():
+        return None
+    return TOKEN_CACHE_KEY.format(key=key)
+
+
+def resolve_token(key):
+    """
+    Map a token key to its ``TokenOwner``, or None for an unknown key.
+    Both are cached for TOKEN_CACHE_TTL seconds, so a dashboard making many
+    API calls costs one query per token per TTL rather than one per call.
+    """
+    cache_key = _cache_key(key)
+    if cache_key is None:
+        return None
+    owner = cache.get(cache_key)
+    if owner is None:
+        row = Token.objects.filter(key=key).values_list(
+            'user_id', 'user__is_active', 'user__username', 'user__is_staff', 'user__is_superuser'
+        ).first()
+        # Cache misses too, so made-up keys don't reach the database each time
+        owner = TokenOwner(*row) if row else ()
+        cache.set(cache_key, tuple(owner), TOKEN_CACHE_TTL)
+    return TokenOwner(*owner) if owner else None
+
+
+def evict_token(key):
+    cache_key = _cache_key(key)
+    if cache_key is not None:
+        cache.delete(cache_key)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    ``TokenAuthentication`` resolving keys through ``resolve_token``. The
+    user and token are built from the cached fields; any other user field
+    is loaded from the database on first access.
+    """
+
+    def authenticate_credentials(self, key):
+        owner = resolve_token(key)
+        if owner is None:
+            raise AuthenticationFailed(_('Invalid token.'))
+        if not owner.is_active:
+            raise AuthenticationFailed(_('User inactive or deleted.'))
+
+        user = get_user_model().from_db(
+            None, ['id', 'is_active', 'username', 'is_staff', 'is_superuser'], owner
+        )
+        token = Token.from_db(None, ['key', 'user_id'], [key, owner.user_id])
+        token.user = user
+        return user, token
+
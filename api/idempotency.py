@@ -0,0 +1,123 @@
+import hashlib
+import json
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from menu.models import IdempotencyKey
+
+
+# How long a key is remembered (expired rows are deleted by the
+# purge_idempotency_keys command), and how old an unanswered claim must be
+# before a retry may take it over, as the worker that made it can only have
+# died
+IDEMPOTENCY_KEY_TTL = getattr(settings, 'IDEMPOTENCY_KEY_TTL', timedelta(hours=24))
+IDEMPOTENCY_CLAIM_TIMEOUT = getattr(settings, 'IDEMPOTENCY_CLAIM_TIMEOUT', timedelta(seconds=60))
+# Seconds a duplicate of an in-flight request is told to wait before retrying
+IDEMPOTENCY_RETRY_AFTER = 1
+
+
+def request_fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(f'{request.method}:{request.path}:{body}'.encode()).hexdigest()
+
+
+def idempotent_response(request, scope, handler):
+    """
+    Run ``handler`` once per ``Idempotency-Key`` header within ``scope``.
+
+    The key is claimed by inserting its row before the handler runs, so a
+    concurrent duplicate on any worker hits the unique constraint instead of
+    repeating the work: it gets the recorded response, or a 409 with
+    Retry-After while the original is still running. Requests without the
+    header simply run the handler.
+    """
+    key = request.headers.get('Idempotency-Key')
+    if not key:
+        return handler()
+
+    key = f'{scope}:{key}'[:255]
+    fingerprint = request_fingerprint(request)
+    record = claim_key(key, fingerprint)
+    if record is None:
+        return replay_response(key, fingerprint)
+
+    try:
+        response = handler()
+    except Exception:
+        record.delete()
+        raise
+
+    if response.status_code >= 500:
+        # Let the client retry server errors with the same key
+        record.delete()
+    else:
+        record.response_status = response.status_code
+        record.response_body = response.data
+        record.save(update_fields=['response_status', 'response_body'])
+    return response
+
+
+def claim_key(key, fingerprint):
+    """
+    Insert the row for ``key``, or take over one that has expired or whose
+    claim was abandoned. Returns the claimed row, or None when the key
+    belongs to another request.
+    """
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(key=key, request_hash=fingerprint)
+    except IntegrityError:
+        pass
+
+    now = timezone.now()
+    expired = Q(created_at__lt=now - IDEMPOTENCY_KEY_TTL)
+    abandoned = Q(
+        request_hash=fingerprint, response_status__isnull=True,
+        claimed_at__lt=now - IDEMPOTENCY_CLAIM_TIMEOUT
+    )
+    # A conditional UPDATE, so only one of several retries wins the takeover
+    taken = IdempotencyKey.objects.filter(expired | abandoned, key=key).update(
+        request_hash=fingerprint, response_status=None, response_body=None,
+        created_at=now, claimed_at=now
+    )
+    return IdempotencyKey.objects.get(key=key) if taken else None
+
+
+def purge_expired_keys():
+    """
+    Delete the keys older than IDEMPOTENCY_KEY_TTL; returns how many.
+    """
+    deleted, _ = IdempotencyKey.objects.filter(
+        created_at__lt=timezone.now() - IDEMPOTENCY_KEY_TTL
+    ).delete()
+    return deleted
+
+
+def replay_response(key, fingerprint):
+    record = IdempotencyKey.objects.filter(key=key).first()
+    if record is None:
+        return Response(
+            {'detail': 'The original request failed; please retry.'},
+            status=status.HTTP_409_CONFLICT
+        )
+    if record.request_hash != fingerprint:
+        return Response(
+            {'detail': 'Idempotency-Key was already used for a different request.'},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+    if record.response_status is None:
+        # Answer at once rather than hold a worker until the original finishes
+        return Response(
+            {'detail': 'A request with this Idempotency-Key is still in progress.'},
+            status=status.HTTP_409_CONFLICT,
+            headers={'Retry-After': str(IDEMPOTENCY_RETRY_AFTER)}
+        )
+    return Response(
+        record.response_body,
+        status=record.response_status,
+        headers={'Idempotent-Replayed': 'true'}
+    )
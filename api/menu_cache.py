@@ -0,0 +1,396 @@
+import gzip
+import time
+import uuid
+from contextlib import contextmanager
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from menu.models import Category, MenuItem, MenuChange, QRCode
+from menu.cache import resolve_qr_table
+from rest_framework.renderers import JSONRenderer
+from api.serializers import CategorySerializer, MenuItemListSerializer
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+
+MENU_VERSION_KEY = 'menu:version'
+QR_VERSION_KEY = 'qr:version'
+KITCHEN_VERSION_KEY = 'kitchen:version'
+MENU_SNAPSHOT_KEY = 'menu:snapshot:{version}'
+MENU_INDEX_KEY = 'menu:index:{version}'
+MENU_PAYLOAD_KEY = 'menu:payload:{version}:{shape}'
+TABLE_MENU_PAYLOAD_KEY = 'menu:payload:{version}:{shape}:{qr_version}:{uuid}'
+CATEGORY_VERSION_KEY = 'menu:category:{category_id}:version'
+CATEGORY_PAGE_KEY = 'menu:category:{category_id}:{version}:{cursor}:{limit}'
+MENU_CHANGES_KEY = 'menu:changes:{since}:{version}'
+
+# Snapshots are keyed by version, so a stale one is never served; the timeout
+# only bounds how long superseded versions linger in the cache.
+MENU_SNAPSHOT_TIMEOUT = getattr(settings, 'MENU_SNAPSHOT_TIMEOUT', 60 * 60 * 24)
+
+# Clients ask for the category index (items fetched per category, a page at
+# a time) with ?lazy=1
+MENU_CATEGORY_PAGE_SIZE = getattr(settings, 'MENU_CATEGORY_PAGE_SIZE', 24)
+MENU_CATEGORY_MAX_PAGE_SIZE = 100
+
+# Journal entries older than this are pruned; clients further behind reload
+MENU_CHANGES_RETENTION_DAYS = getattr(settings, 'MENU_CHANGES_RETENTION_DAYS', 30)
+
+# A version lock left behind by a dead worker expires after this many seconds
+VERSION_LOCK_TIMEOUT = 10
+
+
+def _get_version(key):
+    version = cache.get(key)
+    if version is None:
+        version = _bump_version(key)
+    return version
+
+
+@contextmanager
+def _next_version(key):
+    """
+    Reserve the version that follows ``key``'s current one and publish it
+    when the block exits. Versions are millisecond timestamps, forced forward
+    when two bumps land in the same millisecond, so they keep increasing even
+    if the cache is cleared and double as the Last-Modified time. Bumps of a
+    key hold a lock taken with cache.add, so two workers never read the same
+    current version and publish the same next one.
+    """
+    lock_key, token = f'{key}:lock', uuid.uuid4().hex
+    while not cache.add(lock_key, token, VERSION_LOCK_TIMEOUT):
+        time.sleep(0.005)
+    try:
+        version = int(time.time() * 1000)
+        current = cache.get(key)
+        if current is not None and current >= version:
+            version = current + 1
+        yield version
+        cache.set(key, version, None)
+    finally:
+        # Past the timeout the lock may already belong to another bump
+        if cache.get(lock_key) == token:
+            cache.delete(lock_key)
+
+
+def _bump_version(key):
+    with _next_version(key) as version:
+        return version
+
+
+def get_menu_version():
+    """
+    Return the current menu version, initialising it on first use.
+    """
+    return _get_version(MENU_VERSION_KEY)
+
+
+def bump_menu_version():
+    """
+    Move the menu to a new version so the next read rebuilds the snapshot.
+    """
+    return _bump_version(MENU_VERSION_KEY)
+
+
+def next_menu_version():
+    """
+    Reserve the next menu version for a ``with`` block and publish it when
+    the block exits, so the change journal row written inside is in place
+    before any delta request can ask for that version.
+    """
+    return _next_version(MENU_VERSION_KEY)
+
+
+def get_qr_version():
+    return _get_version(QR_VERSION_KEY)
+
+
+def bump_qr_version():
+    return _bump_version(QR_VERSION_KEY)
+
+
+def get_kitchen_version():
+    return _get_version(KITCHEN_VERSION_KEY)
+
+
+def bump_kitchen_version():
+    return _bump_version(KITCHEN_VERSION_KEY)
+
+
+def get_category_version(category_id):
+    return _get_version(CATEGORY_VERSION_KEY.format(category_id=category_id))
+
+
+def bump_category_version(category_id):
+    """
+    Invalidate the cached item pages of one category, leaving the others.
+    """
+    return _bump_version(CATEGORY_VERSION_KEY.format(category_id=category_id))
+
+
+def make_etag(*parts):
+    return '"%s"' % '-'.join(str(part) for part in parts if part is not None)
+
+
+def not_modified_response(request, etag, version):
+    """
+    Answer a conditional GET with a 304 when the client already holds the
+    representation identified by ``etag``; return None otherwise.
+    """
+    response = get_conditional_response(
+        request, etag=etag, last_modified=version // 1000
+    )
+    if isinstance(response, HttpResponseNotModified):
+        set_validators(response, etag, version)
+    return response
+
+
+def set_validators(response, etag, version):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(version // 1000)
+    return response
+
+
+def build_menu_snapshot():
+    categories = Category.objects.all()
+    menu_items = MenuItem.objects.filter(is_available=True).select_related('category')
+
+    return {
+        'categories': CategorySerializer(categories, many=True).data,
+        'menu_items': MenuItemListSerializer(menu_items, many=True).data,
+    }
+
+
+def get_menu_snapshot():
+    """
+    Return the serialized categories and menu items for the current version,
+    building and caching them on a miss.
+    """
+    key = MENU_SNAPSHOT_KEY.format(version=get_menu_version())
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = build_menu_snapshot()
+        cache.set(key, snapshot, MENU_SNAPSHOT_TIMEOUT)
+    return snapshot
+
+
+def build_menu_index():
+    available = Q(menu_items__is_available=True, menu_items__is_active=True)
+    categories = Category.objects.annotate(item_count=Count('menu_items', filter=available))
+
+    index = [
+        {'id': category.id, 'name': category.name, 'item_count': category.item_count}
+        for category in categories
+    ]
+    return {
+        'lazy': True,
+        'categories': index,
+        'total_items': sum(category['item_count'] for category in index),
+    }
+
+
+def get_menu_index():
+    """
+    Return the categories with their available item counts for the current
+    menu version, building and caching them on a miss.
+    """
+    key = MENU_INDEX_KEY.format(version=get_menu_version())
+    index = cache.get(key)
+    if index is None:
+        index = build_menu_index()
+        cache.set(key, index, MENU_SNAPSHOT_TIMEOUT)
+    return index
+
+
+def use_lazy_menu(request):
+    """
+    Serve the category index instead of the full menu only when asked to
+    with ``?lazy=1``, so API clients always get the shape they expect.
+    """
+    return request.GET.get('lazy', '').lower() in ('1', 'true')
+
+
+def get_menu_data(lazy=False):
+    version = get_menu_version()
+    if lazy:
+        return {'version': version, **get_menu_index()}
+    snapshot = get_menu_snapshot()
+    return {
+        'version': version,
+        'categories': snapshot['categories'],
+        'menu_items': snapshot['menu_items']
+    }
+
+
+def get_table_menu_data(uuid, lazy=False):
+    """
+    Return the menu for the table behind a QR uuid; raises
+    ``QRCode.DoesNotExist`` for unknown codes.
+    """
+    qr_table = resolve_qr_table(uuid)
+    if qr_table is None:
+        raise QRCode.DoesNotExist
+    return {'table_number': qr_table.table_number, **get_menu_data(lazy)}
+
+
+def build_category_page(category_id, cursor, limit):
+    if not Category.objects.filter(pk=category_id).exists():
+        raise Category.DoesNotExist
+
+    # Keyset pagination: fetch one extra row to learn whether a next page exists
+    menu_items = list(
+        MenuItem.objects.filter(category_id=category_id, is_available=True, id__gt=cursor)
+        .select_related('category')
+        .order_by('id')[:limit + 1]
+    )
+    has_next = len(menu_items) > limit
+    menu_items = menu_items[:limit]
+
+    return {
+        'category': category_id,
+        'menu_items': MenuItemListSerializer(menu_items, many=True).data,
+        'next_cursor': menu_items[-1].id if has_next else None,
+    }
+
+
+def get_category_page(category_id, cursor=0, limit=MENU_CATEGORY_PAGE_SIZE):
+    """
+    Return one page of a category's available items, cached per category
+    version so edits elsewhere in the menu leave it intact. Raises
+    ``Category.DoesNotExist`` for unknown or inactive categories.
+    """
+    key = CATEGORY_PAGE_KEY.format(
+        category_id=category_id, version=get_category_version(category_id),
+        cursor=cursor, limit=limit
+    )
+    page = cache.get(key)
+    if page is None:
+        page = build_category_page(category_id, cursor, limit)
+        cache.set(key, page, MENU_SNAPSHOT_TIMEOUT)
+    return page
+
+
+def changes_cutoff_version():
+    """
+    Oldest version the change journal still covers.
+    """
+    return int((time.time() - MENU_CHANGES_RETENTION_DAYS * 24 * 60 * 60) * 1000)
+
+
+def build_menu_changes(since, version):
+    latest = {}
+    changes = MenuChange.objects.filter(version__gt=since, version__lte=version)
+    for kind, object_id, deleted in changes.values_list('kind', 'object_id', 'deleted'):
+        latest[(kind, object_id)] = deleted
+
+    item_ids = [object_id for (kind, object_id) in latest if kind == 'item']
+    category_ids = [object_id for (kind, object_id) in latest if kind == 'category']
+
+    # Deleted, deactivated and unavailable rows all drop out of these queries
+    menu_items = MenuItem.objects.filter(id__in=item_ids, is_available=True).select_related('category')
+    categories = Category.objects.filter(id__in=category_ids)
+    menu_items = MenuItemListSerializer(menu_items, many=True).data
+    categories = CategorySerializer(categories, many=True).data
+
+    present_items = {item['id'] for item in menu_items}
+    present_categories = {category['id'] for category in categories}
+    return {
+        'since': since,
+        'version': version,
+        'categories': categories,
+        'removed_categories': [pk for pk in category_ids if pk not in present_categories],
+        'menu_items': menu_items,
+        'removed_items': [pk for pk in item_ids if pk not in present_items],
+    }
+
+
+def get_menu_changes(since):
+    """
+    Return the categories and items added, changed or removed after menu
+    version ``since``, or a ``reset`` marker when the journal no longer
+    reaches that far back, or ``since`` is newer than any version issued,
+    and the client must reload the full menu.
+    """
+    version = get_menu_version()
+    if not changes_cutoff_version() <= since <= version:
+        return {'reset': True, 'version': version}
+
+    key = MENU_CHANGES_KEY.format(since=since, version=version)
+    changes = cache.get(key)
+    if changes is None:
+        changes = build_menu_changes(since, version)
+        cache.set(key, changes, MENU_SNAPSHOT_TIMEOUT)
+    return changes
+
+
+def precompressed_enabled():
+    return getattr(settings, 'MENU_PRECOMPRESSED', True)
+
+
+def negotiate_encoding(request):
+    """
+    Pick the precompressed variant to serve from the request's
+    Accept-Encoding header, or None for the uncompressed body.
+    """
+    if not precompressed_enabled():
+        return None
+
+    accepted = set()
+    for part in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        coding, _, params = part.partition(';')
+        params = params.replace(' ', '')
+        if params.startswith('q='):
+            try:
+                if float(params[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding.strip().lower())
+
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+
+def encode_payload(data):
+    """
+    Render ``data`` to JSON once and keep every compressed variant next to it.
+    """
+    body = JSONRenderer().render(data)
+    payload = {
+        'identity': body,
+        'gzip': gzip.compress(body, compresslevel=9, mtime=0),
+    }
+    if brotli is not None:
+        payload['br'] = brotli.compress(body, quality=11)
+    return payload
+
+
+def get_menu_payload(key, build):
+    """
+    Return the encoded payload stored under ``key``, rendering the data from
+    ``build()`` on a miss. Keys embed the versions the data depends on.
+    """
+    payload = cache.get(key)
+    if payload is None:
+        payload = encode_payload(build())
+        cache.set(key, payload, MENU_SNAPSHOT_TIMEOUT)
+    return payload
+
+
+def payload_response(payload, encoding):
+    response = HttpResponse(
+        payload[encoding or 'identity'], content_type='application/json'
+    )
+    if encoding:
+        response['Content-Encoding'] = encoding
+    response['Vary'] = 'Accept-Encoding'
+    return response
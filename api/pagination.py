@@ -0,0 +1,87 @@
+import base64
+from django.conf import settings
+from django.db.models import prefetch_related_objects
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class OrderBoardPagination(BasePagination):
+    """
+    Keyset pagination over the order board ordering
+    (status_priority, -created_at, -id), which the matching index on Order
+    serves directly. ``after`` is an opaque token for the last order of the
+    previous page, so every page costs the same however deep it is.
+    """
+    cursor_query_param = 'after'
+    page_size_query_param = 'page_size'
+    page_size = settings.REST_FRAMEWORK.get('PAGE_SIZE', 50)
+    max_page_size = 200
+    ordering = ('status_priority', '-created_at', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        position = self.decode_cursor(request.query_params.get(self.cursor_query_param))
+
+        # Rest of the cursor's priority, then the later priorities: each is a
+        # single forward range of the index, where one OR'd filter would
+        # make the database sort the whole remainder
+        lookups = queryset._prefetch_related_lookups
+        queryset = queryset.prefetch_related(None).order_by(*self.ordering)
+        if position is None:
+            segments = [queryset]
+        else:
+            priority, created_at, pk = position
+            segments = [
+                queryset.filter(status_priority=priority, created_at__lte=created_at)
+                .exclude(created_at=created_at, id__gte=pk),
+                queryset.filter(status_priority__gt=priority),
+            ]
+
+        page = []
+        for segment in segments:
+            page += segment[:self.page_size + 1 - len(page)]
+            if len(page) > self.page_size:
+                break
+
+        self.has_next = len(page) > self.page_size
+        page = page[:self.page_size]
+        prefetch_related_objects(page, *lookups)
+        self.last = page[-1] if page else None
+        return page
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            raise ValidationError({self.page_size_query_param: 'Must be an integer.'})
+        return max(1, min(size, self.max_page_size))
+
+    def encode_cursor(self, order):
+        raw = f'{order.status_priority}|{order.created_at.isoformat()}|{order.id}'
+        return base64.urlsafe_b64encode(raw.encode()).decode('ascii')
+
+    def decode_cursor(self, token):
+        if not token:
+            return None
+        try:
+            priority, created_at, pk = base64.urlsafe_b64decode(token.encode()).decode().split('|')
+            created_at = parse_datetime(created_at)
+            if created_at is None:
+                raise ValueError
+            return int(priority), created_at, int(pk)
+        except (ValueError, UnicodeDecodeError):
+            raise ValidationError({self.cursor_query_param: 'Invalid cursor.'})
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.page_size_query_param, self.page_size)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.last))
+
+    def get_paginated_response(self, data, **extra):
+        return Response({'next': self.get_next_link(), **extra, 'results': data})
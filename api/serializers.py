@@ -1,4 +1,5 @@
 import cloudinary.uploader
+from django.db import transaction
 from rest_framework import serializers
 from menu.models import Category, MenuItem, Order, OrderItem, QRCode
 from menu.models import VisitorLog, ActivityLog, DailyRevenue
@@ -19,7 +20,8 @@ class MenuItemSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = MenuItem
-        fields = ['id', 'name', 'description', 'price', 'image', 'image_url', 'category', 'category_details', 'is_available']
+        fields = ['id', 'name', 'description', 'price', 'image', 'image_url', 'image_variants', 'category', 'category_details', 'is_available']
+        read_only_fields = ['image_variants']
 
     def get_image_url(self, obj):
         if obj.image:
@@ -48,12 +50,106 @@ class MenuItemSerializer(serializers.ModelSerializer):
             print("UPDATE ERROR:", str(e))
             raise serializers.ValidationError(f"Error updating menu item: {str(e)}")
 
+class MenuItemListSerializer(serializers.ModelSerializer):
+    """
+    Read-only representation for list responses. Expects the queryset to
+    select_related('category') and builds the absolute URL prefix once per
+    response instead of once per item.
+    """
+    category_details = CategorySerializer(source='category', read_only=True)
+    image = serializers.SerializerMethodField()
+
+    class Meta:
+        model = MenuItem
+        fields = ['id', 'name', 'description', 'price', 'image', 'image_variants', 'category', 'category_details', 'is_available']
+        read_only_fields = fields
+
+    def _absolute_url(self, url):
+        if not url.startswith('/'):
+            return url
+        if not hasattr(self, '_url_root'):
+            request = self.context.get('request')
+            self._url_root = request.build_absolute_uri('/')[:-1] if request else ''
+        return self._url_root + url
+
+    def get_image(self, obj):
+        return self._absolute_url(obj.image.url) if obj.image else None
+
+
 class OrderItemSerializer(serializers.ModelSerializer):
     menu_item_name = serializers.CharField(source='menu_item.name', read_only=True)
     
     class Meta:
         model = OrderItem
-        fields = ['id', 'menu_item', 'menu_item_name', 'quantity', 'price_at_order']
+        fields = ['id', 'menu_item', 'menu_item_name', 'quantity', 'price_at_order', 'prep_status']
+
+
+class OrderItemWriteSerializer(serializers.ModelSerializer):
+    """
+    Adds a line to an open order or changes its quantity, moving the order
+    total by the difference instead of recomputing it from every line.
+    """
+    menu_item_name = serializers.CharField(source='menu_item.name', read_only=True)
+    order_total = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+
+    class Meta:
+        model = OrderItem
+        fields = ['id', 'order', 'menu_item', 'menu_item_name', 'quantity', 'price_at_order', 'order_total']
+        read_only_fields = ['price_at_order']
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if self.instance is not None:
+            # Only the quantity of an existing line can change
+            fields['order'].read_only = True
+            fields['menu_item'].read_only = True
+        return fields
+
+    def validate_order(self, order):
+        if order.status not in Order.EDITABLE_STATUSES:
+            raise serializers.ValidationError(f"Lines of a {order.status} order can't be changed.")
+        return order
+
+    def validate_menu_item(self, menu_item):
+        if not menu_item.is_available:
+            raise serializers.ValidationError("This menu item is not available.")
+        return menu_item
+
+    def validate_quantity(self, quantity):
+        if quantity < 1:
+            raise serializers.ValidationError("Quantity must be a positive integer.")
+        return quantity
+
+    def validate(self, attrs):
+        if self.instance is not None and self.instance.order.status not in Order.EDITABLE_STATUSES:
+            raise serializers.ValidationError(
+                f"Lines of a {self.instance.order.status} order can't be changed."
+            )
+        return attrs
+
+    def create(self, validated_data):
+        with transaction.atomic():
+            line = OrderItem.objects.create(
+                price_at_order=validated_data['menu_item'].price, **validated_data
+            )
+            Order.add_to_total(line.order_id, line.price_at_order * line.quantity)
+            line.order_total = self._order_total(line)
+        return line
+
+    def update(self, instance, validated_data):
+        quantity = validated_data.get('quantity', instance.quantity)
+        with transaction.atomic():
+            # Lock the line so concurrent edits compute their difference in turn
+            current = OrderItem.objects.select_for_update().values_list('quantity', flat=True)\
+                .get(pk=instance.pk)
+            OrderItem.objects.filter(pk=instance.pk).update(quantity=quantity)
+            Order.add_to_total(instance.order_id, instance.price_at_order * (quantity - current))
+            instance.quantity = quantity
+            instance.order_total = self._order_total(instance)
+        return instance
+
+    def _order_total(self, line):
+        return Order.all.values_list('total_price', flat=True).get(pk=line.order_id)
 
 
 class OrderSerializer(serializers.ModelSerializer):
@@ -76,28 +172,22 @@ class OrderCreateSerializer(serializers.ModelSerializer):
     
     def create(self, validated_data):
         items_data = validated_data.pop('items')
-        order = Order.objects.create(**validated_data)
-        total_price = 0
-        
-        for item_data in items_data:
-            try:
-                menu_item = MenuItem.objects.get(id=item_data['menu_item_id'], is_available=True)
-                quantity = item_data.get('quantity', 1)
-                price_at_order = menu_item.price
-                
-                OrderItem.objects.create(
-                    order=order,
-                    menu_item=menu_item,
-                    quantity=quantity,
-                    price_at_order=price_at_order
-                )
-                
-                total_price += price_at_order * quantity
-            except MenuItem.DoesNotExist:
-                continue
-        
-        order.total_price = total_price
-        order.save()
+        order_items = [
+            OrderItem(
+                menu_item=item_data['menu_item'],
+                quantity=item_data.get('quantity', 1),
+                price_at_order=item_data['menu_item'].price
+            )
+            for item_data in items_data
+        ]
+        total_price = sum(item.price_at_order * item.quantity for item in order_items)
+
+        # Written once with its final total, so post_save sees the real amount
+        with transaction.atomic():
+            order = Order.objects.create(total_price=total_price, **validated_data)
+            for order_item in order_items:
+                order_item.order = order
+            OrderItem.objects.bulk_create(order_items)
         return order
     
     def validate_items(self, value):
@@ -110,10 +200,33 @@ class OrderCreateSerializer(serializers.ModelSerializer):
             
             if not isinstance(item.get('quantity', 1), int) or item.get('quantity', 1) < 1:
                 raise serializers.ValidationError("Quantity must be a positive integer.")
-        
+
+            try:
+                item['menu_item_id'] = int(item['menu_item_id'])
+            except (TypeError, ValueError):
+                raise serializers.ValidationError("menu_item_id must be an integer.")
+
+        # Resolve every line's menu item in one query
+        ids = {item['menu_item_id'] for item in value}
+        menu_items = MenuItem.objects.filter(id__in=ids, is_available=True).in_bulk()
+        unknown = sorted(ids - set(menu_items))
+        if unknown:
+            raise serializers.ValidationError(
+                f"Unknown or unavailable menu items: {', '.join(map(str, unknown))}."
+            )
+
+        for item in value:
+            item['menu_item'] = menu_items[item['menu_item_id']]
         return value
 
 
+class OrderBulkStatusSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False, max_length=500
+    )
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES)
+
+
 class QRCodeSerializer(serializers.ModelSerializer):
     qr_code_url = serializers.SerializerMethodField()
     logo_url = serializers.SerializerMethodField()
@@ -151,9 +264,20 @@ class QRCodeCreateSerializer(serializers.ModelSerializer):
         
 
 class VisitorLogSerializer(serializers.ModelSerializer):
+    # Read from the UserAgent/Page dimension rows; select_related them
+    user_agent = serializers.CharField(read_only=True)
+    browser = serializers.CharField(read_only=True)
+    os = serializers.CharField(read_only=True)
+    device = serializers.CharField(read_only=True)
+    referrer = serializers.CharField(read_only=True)
+    page_visited = serializers.CharField(read_only=True)
+
     class Meta:
         model = VisitorLog
-        fields = '__all__'
+        fields = [
+            'id', 'visitor_type', 'session_id', 'ip_address', 'user_agent', 'browser', 'os',
+            'device', 'referrer', 'page_visited', 'table_number', 'qr_code', 'timestamp', 'duration',
+        ]
 
 class ActivityLogSerializer(serializers.ModelSerializer):
     username = serializers.CharField(source='user.username', read_only=True, allow_null=True)
@@ -179,4 +303,5 @@ class AnalyticsSummarySerializer(serializers.Serializer):
     hourly_orders = serializers.ListField()
     category_revenue = serializers.ListField()
     revenue_data = serializers.ListField()
-    visitor_data = serializers.ListField()
\ No newline at end of file
+    visitor_data = serializers.ListField()
+    throttled_requests = serializers.DictField(child=serializers.IntegerField())
\ No newline at end of file
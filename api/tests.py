@@ -1,3 +1,781 @@
-from django.test import TestCase
+import gzip
+import threading
+from datetime import timedelta
+from unittest import mock, skipUnless
+from io import StringIO
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+from menu.models import (
+    ActivityLog, Category, DailyRevenue, HourlyVisitorCount, IdempotencyKey, MenuChange, MenuItem, Order,
+    OrderEvent, OrderItem, Page, QRCode, UserAgent, VisitorLog
+)
+from api.menu_cache import (
+    brotli, build_menu_snapshot, bump_menu_version, changes_cutoff_version, get_menu_version
+)
+from api.serializers import OrderCreateSerializer
+from api.throttling import rejection_counts
+from menu.kitchen import kitchen_queue
+from menu.cache import UserAgentCache, page_ids, qr_table_cache, resolve_qr_table, user_agent_ids
+from menu.visitors import VisitorCountFlusher, VisitorLogBuffer, flush_visitor_counts, record_visit
 
-# Create your tests here.
+
+class QueryCountTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('manager', password='secret')
+        self.client.force_authenticate(self.user)
+
+    def create_orders(self, count):
+        start = Order.objects.count()
+        for i in range(start, start + count):
+            category = Category.objects.create(name=f'Category {i}')
+            item = MenuItem.objects.create(name=f'Item {i}', price=10, category=category)
+            order = Order.objects.create(table_number=str(i))
+            OrderItem.objects.create(order=order, menu_item=item, quantity=2, price_at_order=10)
+
+    def test_order_list_query_count_is_constant(self):
+        self.create_orders(1)
+        with self.assertNumQueries(4):
+            self.client.get('/api/orders/')
+
+        self.create_orders(10)
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/orders/')
+        results = response.json()['results']
+        self.assertEqual(len(results), 11)
+        self.assertTrue(all(order['items'][0]['menu_item_name'] for order in results))
+
+    def test_menu_item_list_query_count_is_constant(self):
+        self.create_orders(1)
+        with self.assertNumQueries(2):
+            self.client.get('/api/menu_items/')
+
+        self.create_orders(10)
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/menu_items/')
+        self.assertEqual(response.json()['count'], 11)
+
+    def test_menu_snapshot_query_count_is_constant(self):
+        self.create_orders(10)
+        with self.assertNumQueries(2):
+            snapshot = build_menu_snapshot()
+        self.assertEqual(len(snapshot['menu_items']), 10)
+
+
+class MenuCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='Drinks')
+        self.item = MenuItem.objects.create(name='Tea', price=10, category=self.category)
+
+    def test_menu_version_moves_when_the_edit_commits(self):
+        version = get_menu_version()
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.item.price = 12
+            self.item.save()
+            self.assertEqual(get_menu_version(), version)
+            self.assertFalse(MenuChange.objects.exists())
+        for callback in callbacks:
+            callback()
+        self.assertGreater(get_menu_version(), version)
+        self.assertTrue(MenuChange.objects.filter(kind='item', object_id=self.item.id).exists())
+
+    def test_concurrent_bumps_publish_distinct_versions(self):
+        versions = []
+
+        def bump():
+            for _ in range(25):
+                versions.append(bump_menu_version())
+
+        threads = [threading.Thread(target=bump) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(set(versions)), 100)
+        self.assertEqual(get_menu_version(), max(versions))
+
+    def test_unchanged_menu_is_answered_with_304(self):
+        response = self.client.get('/api/menu/')
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+        not_modified = self.client.get('/api/menu/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified['ETag'], etag)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.item.name = 'Green tea'
+            self.item.save()
+        response = self.client.get('/api/menu/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['menu_items'][0]['name'], 'Green tea')
+
+    @skipUnless(brotli, 'brotli is not installed')
+    def test_precompressed_variant_follows_accept_encoding(self):
+        identity = self.client.get('/api/menu/')
+        self.assertFalse(identity.has_header('Content-Encoding'))
+
+        responses = {}
+        for accept, encoding in [('gzip, deflate, br', 'br'), ('gzip, br;q=0', 'gzip'), ('gzip;q=0', None)]:
+            response = self.client.get('/api/menu/', HTTP_ACCEPT_ENCODING=accept)
+            self.assertEqual(response.get('Content-Encoding'), encoding)
+            self.assertIn('Accept-Encoding', response['Vary'])
+            responses[encoding] = response
+        self.assertEqual(brotli.decompress(responses['br'].content), identity.content)
+        self.assertEqual(gzip.decompress(responses['gzip'].content), identity.content)
+        # Caches must not hand one encoding's ETag to a client of another
+        self.assertEqual(len({response['ETag'] for response in responses.values()}), 3)
+
+    def test_changes_since_a_version_hold_only_the_delta(self):
+        since = self.client.get('/api/menu/').json()['version']
+        with self.captureOnCommitCallbacks(execute=True):
+            coffee = MenuItem.objects.create(name='Coffee', price=15, category=self.category)
+            self.item.is_available = False
+            self.item.save()
+
+        data = self.client.get('/api/menu/changes/', {'since': since}).json()
+        self.assertEqual(data['version'], get_menu_version())
+        self.assertEqual([item['id'] for item in data['menu_items']], [coffee.id])
+        self.assertEqual(data['removed_items'], [self.item.id])
+        self.assertEqual((data['categories'], data['removed_categories']), ([], []))
+
+        data = self.client.get('/api/menu/changes/', {'since': data['version']}).json()
+        self.assertEqual((data['menu_items'], data['removed_items']), ([], []))
+
+    def test_delta_read_while_an_edit_is_journalled_misses_nothing(self):
+        since = get_menu_version()
+        create = MenuChange.objects.create
+        seen = []
+
+        def create_during_a_delta_request(**kwargs):
+            seen.append(self.client.get('/api/menu/changes/', {'since': since}).json())
+            return create(**kwargs)
+
+        with mock.patch.object(MenuChange.objects, 'create', side_effect=create_during_a_delta_request):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.item.price = 12
+                self.item.save()
+        # The version wasn't published yet, so nothing was cached under it
+        self.assertEqual(seen[0]['version'], since)
+        data = self.client.get('/api/menu/changes/', {'since': since}).json()
+        self.assertEqual(data['version'], get_menu_version())
+        self.assertEqual([item['id'] for item in data['menu_items']], [self.item.id])
+
+    def test_version_outside_the_journal_forces_a_full_reload(self):
+        version = get_menu_version()
+        for since in (changes_cutoff_version() - 1, version + 1):
+            data = self.client.get('/api/menu/changes/', {'since': since}).json()
+            self.assertEqual(data, {'reset': True, 'version': version})
+
+    def test_lazy_index_is_opt_in(self):
+        self.assertEqual(len(self.client.get('/api/menu/').json()['menu_items']), 1)
+        data = self.client.get('/api/menu/', {'lazy': '1'}).json()
+        self.assertTrue(data['lazy'])
+        self.assertEqual(data['categories'][0]['item_count'], 1)
+
+
+class MenuSearchTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Hot drinks')
+        for name in ('Café latte', 'Cappuccino', 'Masala tea'):
+            MenuItem.objects.create(name=name, price=10, category=category)
+
+    def search(self, query):
+        response = self.client.get('/api/menu/search/', {'q': query})
+        return [item['name'] for item in response.json()['results']]
+
+    def test_accents_prefixes_and_typos_match(self):
+        self.assertEqual(self.search('cafe'), ['Café latte'])
+        self.assertEqual(self.search('CAPP'), ['Cappuccino'])
+        self.assertEqual(self.search('cappucino'), ['Cappuccino'])
+        self.assertEqual(self.search('latet'), ['Café latte'])
+        # Every word must match, and category names count
+        self.assertEqual(self.search('hot masala'), ['Masala tea'])
+        self.assertEqual(self.search('cafe tea'), [])
+        # Short words get no typo tolerance
+        self.assertEqual(self.search('tae'), [])
+
+
+class QRTableCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        qr_table_cache.clear()
+        self.qr = QRCode.objects.create(table_number='7')
+
+    def test_tables_are_served_from_the_lru_until_edited(self):
+        self.assertEqual(resolve_qr_table(self.qr.uuid).table_number, '7')
+        with self.assertNumQueries(0):
+            self.assertEqual(resolve_qr_table(self.qr.uuid).table_number, '7')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.qr.table_number = '8'
+            self.qr.save()
+        self.assertEqual(resolve_qr_table(self.qr.uuid).table_number, '8')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.qr.delete()
+        self.assertIsNone(resolve_qr_table(self.qr.uuid))
+        self.assertEqual(self.client.get(f'/api/menu/{self.qr.uuid}/').status_code, 404)
+
+
+class IdempotencyTests(APITestCase):
+    def setUp(self):
+        category = Category.objects.create(name='Drinks')
+        self.item = MenuItem.objects.create(name='Tea', price=10, category=category)
+
+    def post_order(self, key, quantity=1):
+        return self.client.post('/api/orders/', {
+            'table_number': '4',
+            'items': [{'menu_item_id': self.item.id, 'quantity': quantity}],
+        }, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_replayed_order_returns_original_response(self):
+        first = self.post_order('abc')
+        replay = self.post_order('abc')
+
+        self.assertEqual(replay.status_code, 201)
+        self.assertEqual(replay.json(), first.json())
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_key_reused_for_different_order_is_rejected(self):
+        self.post_order('abc')
+        response = self.post_order('abc', quantity=3)
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_abandoned_claim_is_taken_over(self):
+        self.post_order('abc')
+        Order.objects.all().delete()
+        # As if the worker died after claiming the key
+        IdempotencyKey.objects.update(response_status=None, response_body=None)
+        in_flight = self.post_order('abc')
+        self.assertEqual(in_flight.status_code, 409)
+        self.assertEqual(in_flight['Retry-After'], '1')
+
+        IdempotencyKey.objects.update(claimed_at=timezone.now() - timedelta(minutes=2))
+        response = self.post_order('abc')
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(response.has_header('Idempotent-Replayed'))
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_expired_keys_are_purged_by_the_command(self):
+        self.post_order('abc')
+        self.post_order('def')
+        IdempotencyKey.objects.filter(key__endswith=':abc').update(created_at=timezone.now() - timedelta(days=2))
+        call_command('purge_idempotency_keys', stdout=StringIO())
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['orders:def'])
+
+
+class OrderCreateTests(APITestCase):
+    def setUp(self):
+        category = Category.objects.create(name='Drinks')
+        self.items = [MenuItem.objects.create(name=f'Tea {i}', price=10, category=category) for i in range(5)]
+
+    def test_unknown_menu_items_are_rejected(self):
+        unavailable = self.items[0]
+        unavailable.is_available = False
+        unavailable.save()
+        response = self.client.post('/api/orders/', {
+            'table_number': '4',
+            'items': [{'menu_item_id': pk, 'quantity': 1} for pk in (unavailable.id, self.items[1].id, 999999)],
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(f'{unavailable.id}, 999999', response.json()['items'][0])
+        self.assertFalse(Order.objects.exists())
+
+    def test_menu_items_are_looked_up_in_one_query(self):
+        serializer = OrderCreateSerializer(data={
+            'table_number': '4',
+            'items': [{'menu_item_id': item.id, 'quantity': 2} for item in self.items],
+        })
+        with self.assertNumQueries(1):
+            self.assertTrue(serializer.is_valid())
+        self.assertEqual(
+            [line['menu_item'] for line in serializer.validated_data['items']], self.items
+        )
+
+
+class OrderEventTests(APITestCase):
+    def setUp(self):
+        category = Category.objects.create(name='Drinks')
+        self.item = MenuItem.objects.create(name='Tea', price=10, category=category)
+
+    def test_order_events_are_recorded_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/orders/', {
+                'table_number': '4',
+                'items': [{'menu_item_id': self.item.id, 'quantity': 2}],
+            }, format='json')
+        order = Order.objects.get(pk=response.json()['id'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            order.table_number = '5'
+            order.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            order.status = 'in_progress'
+            order.save()
+
+        events = list(OrderEvent.objects.values_list('event_type', 'payload'))
+        self.assertEqual([event_type for event_type, _ in events], ['order_created', 'order_status_changed'])
+        self.assertEqual(events[0][1]['items'][0]['quantity'], 2)
+        self.assertEqual(events[1][1]['status'], 'in_progress')
+
+    def test_event_poll_requires_authentication(self):
+        self.assertEqual(self.client.get('/api/orders/events/').status_code, 401)
+
+    def test_event_poll_returns_recorded_events_at_once(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            order = Order.objects.create(table_number='4')
+        self.client.force_authenticate(User.objects.create_user('manager', password='secret'))
+
+        response = self.client.get('/api/orders/events/?last_event_id=0')
+        events = response.json()['events']
+        self.assertEqual([(event['type'], event['order']['id']) for event in events], [('order_created', order.id)])
+        self.assertEqual(response.json()['last_event_id'], events[0]['id'])
+
+    def test_old_events_are_purged_by_the_command(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            old = Order.objects.create(table_number='4')
+            recent = Order.objects.create(table_number='5')
+        OrderEvent.objects.filter(order_id=old.id).update(created_at=timezone.now() - timedelta(hours=2))
+        call_command('purge_order_events', stdout=StringIO())
+        self.assertEqual(list(OrderEvent.objects.values_list('order_id', flat=True)), [recent.id])
+
+
+class OrderDeltaTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('manager', password='secret')
+        self.client.force_authenticate(self.user)
+
+    def test_delta_query_uses_updated_at_index_with_large_history(self):
+        Order.all.bulk_create(
+            [Order(table_number=str(i % 40), status='archived') for i in range(100_000)],
+            batch_size=5000
+        )
+        Order.all.update(updated_at=timezone.now() - timedelta(days=30))
+
+        cursor = self.client.get('/api/orders/').json()['cursor']
+        self.assertIn('USING INDEX', Order.all.filter(updated_at__gt=timezone.now()).explain())
+
+        live = Order.objects.create(table_number='1')
+        archived = Order.all.filter(status='archived').first()
+        archived.save()
+
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/orders/', {'updated_since': cursor})
+        data = response.json()
+        self.assertEqual([order['id'] for order in data['results']], [live.id])
+        self.assertEqual(data['archived'], [archived.id])
+        self.assertGreater(data['cursor'], cursor)
+
+    def test_invalid_updated_since_is_rejected(self):
+        for since in ('yesterday', '2024-13-01T00:00:00'):
+            response = self.client.get('/api/orders/', {'updated_since': since})
+            self.assertEqual(response.status_code, 400)
+
+    def test_stale_cursor_forces_a_reload(self):
+        since = (timezone.now() - timedelta(hours=1)).isoformat()
+        Order.objects.create(table_number='1')
+        response = self.client.get('/api/orders/', {'updated_since': since})
+        self.assertEqual(response.json(), {'reset': True})
+
+
+class OrderBoardTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('manager', password='secret')
+        self.client.force_authenticate(self.user)
+
+    def test_board_pages_follow_status_priority(self):
+        statuses = ['completed', 'new', 'archived', 'in_progress', 'new', 'cancelled', 'pending']
+        for i, order_status in enumerate(statuses):
+            Order.objects.create(table_number=str(i), status=order_status)
+
+        ids, url = [], '/api/orders/?page_size=2'
+        while url:
+            data = self.client.get(url).json()
+            self.assertLessEqual(len(data['results']), 2)
+            ids += [order['id'] for order in data['results']]
+            url = data['next']
+
+        expected = Order.objects.exclude(status='archived')\
+            .order_by('status_priority', '-created_at', '-id').values_list('id', flat=True)
+        self.assertEqual(ids, list(expected))
+        self.assertEqual(data['counts'], {
+            'new': 2, 'in_progress': 1, 'pending': 1, 'cancelled': 1, 'completed': 1,
+        })
+
+    def test_invalid_page_cursor_is_rejected(self):
+        response = self.client.get('/api/orders/', {'after': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+
+class OrderBulkStatusTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('manager', password='secret')
+        self.client.force_authenticate(self.user)
+
+    def test_archiving_many_orders_is_one_update(self):
+        orders = Order.all.bulk_create(
+            [Order(table_number=str(i), status='completed', status_priority=5) for i in range(200)]
+        )
+        open_order = Order.objects.create(table_number='open')
+        ids = [order.id for order in orders] + [open_order.id, 999999]
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                '/api/orders/bulk_status/', {'ids': ids, 'status': 'archived'}, format='json'
+            )
+        # Statements on the order table itself; the revenue rollup adds its own
+        statements = [
+            query['sql'].split()[0] for query in queries if '"menu_order"' in query['sql'].split('WHERE')[0]
+        ]
+        self.assertEqual(statements.count('SELECT'), 1)
+        self.assertEqual(statements.count('UPDATE'), 1)
+
+        data = response.json()
+        self.assertEqual(data['updated'], 200)
+        self.assertEqual(data['results'][-2]['error'], 'Cannot change a new order to archived.')
+        self.assertEqual(data['results'][-1]['error'], 'Order not found.')
+        self.assertEqual(Order.objects.filter(status='archived', status_priority=6).count(), 200)
+        self.assertEqual(ActivityLog.objects.filter(activity_type='order_updated').count(), 200)
+        # Archived orders leave the live revenue figures, so they are rolled up
+        self.assertEqual(DailyRevenue.objects.get().total_orders, 200)
+
+    def test_archiving_one_completed_order_rolls_up_its_revenue(self):
+        order = Order.objects.create(table_number='4', status='completed', total_price=25)
+        response = self.client.patch(f'/api/orders/{order.id}/', {'status': 'archived'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        revenue = DailyRevenue.objects.get()
+        self.assertEqual((revenue.total_revenue, revenue.total_orders), (25, 1))
+
+
+class ArchiveOrdersTests(APITestCase):
+    def test_archive_job_rolls_revenue_into_daily_totals(self):
+        old = timezone.now() - timedelta(days=40)
+        Order.all.bulk_create(
+            [Order(table_number=str(i), status='completed', total_price=10) for i in range(7)]
+            + [Order(table_number='x', status='cancelled', total_price=99)]
+            + [Order(table_number='new', status='new', total_price=5)]
+        )
+        Order.all.update(created_at=old)
+        recent = Order.objects.create(table_number='recent', status='completed', total_price=10)
+
+        call_command('archive_orders', '--chunk-size', '3', stdout=StringIO())
+        call_command('archive_orders', stdout=StringIO())
+
+        revenue = DailyRevenue.objects.get()
+        self.assertEqual(revenue.date, timezone.localdate(old))
+        self.assertEqual((revenue.total_revenue, revenue.total_orders), (70, 7))
+        self.assertEqual(revenue.average_order_value, 10)
+        self.assertEqual(Order.objects.filter(status='archived').count(), 8)
+        self.assertEqual(Order.objects.get(pk=recent.pk).status, 'completed')
+        self.assertEqual(Order.objects.get(table_number='new').status, 'new')
+
+
+class OrderItemTests(APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_user('manager', password='secret'))
+        category = Category.objects.create(name='Drinks')
+        self.tea = MenuItem.objects.create(name='Tea', price=10, category=category)
+        self.cake = MenuItem.objects.create(name='Cake', price=25, category=category)
+        self.order = Order.objects.create(table_number='4', total_price=20)
+        self.line = OrderItem.objects.create(order=self.order, menu_item=self.tea, quantity=2, price_at_order=10)
+
+    def total(self):
+        return Order.objects.get(pk=self.order.pk).total_price
+
+    def test_line_edits_keep_total_in_sync(self):
+        response = self.client.post('/api/order_items/', {
+            'order': self.order.id, 'menu_item': self.cake.id, 'quantity': 2,
+        }, format='json')
+        self.assertEqual(response.json()['order_total'], '70.00')
+
+        response = self.client.patch(f'/api/order_items/{self.line.id}/', {'quantity': 5}, format='json')
+        self.assertEqual(response.json()['order_total'], '100.00')
+
+        self.client.delete(f'/api/order_items/{self.line.id}/')
+        self.assertEqual(self.total(), 50)
+
+        call_command('check_order_totals', stdout=StringIO())
+
+    def test_lines_of_finished_orders_are_locked(self):
+        Order.objects.filter(pk=self.order.pk).update(status='completed')
+        response = self.client.patch(f'/api/order_items/{self.line.id}/', {'quantity': 5}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.total(), 20)
+
+    def test_checker_finds_and_fixes_drifted_totals(self):
+        Order.objects.filter(pk=self.order.pk).update(total_price=999)
+        with self.assertRaises(CommandError):
+            call_command('check_order_totals', stdout=StringIO())
+        call_command('check_order_totals', '--fix', stdout=StringIO())
+        self.assertEqual(self.total(), 20)
+
+
+class KitchenQueueTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        kitchen_queue.invalidate()
+        self.client.force_authenticate(User.objects.create_user('cook', password='secret'))
+        self.drinks = Category.objects.create(name='Drinks')
+        mains = Category.objects.create(name='Mains')
+        tea = MenuItem.objects.create(name='Tea', price=10, category=self.drinks)
+        stew = MenuItem.objects.create(name='Stew', price=40, category=mains)
+        first = Order.objects.create(table_number='1', total_price=10)
+        self.second = Order.objects.create(table_number='2', total_price=50)
+        self.first_tea = OrderItem.objects.create(order=first, menu_item=tea, quantity=1, price_at_order=10)
+        self.second_tea = OrderItem.objects.create(order=self.second, menu_item=tea, quantity=1, price_at_order=10)
+        OrderItem.objects.create(order=self.second, menu_item=stew, quantity=1, price_at_order=40)
+
+    def station(self, **headers):
+        return self.client.get(f'/api/kitchen/{self.drinks.id}/', **headers)
+
+    def bump(self, line):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(f'/api/kitchen/items/{line.id}/bump/')
+
+    def test_bumps_reorder_the_station_queue(self):
+        response = self.station()
+        self.assertEqual([item['id'] for item in response.json()['items']], [self.first_tea.id, self.second_tea.id])
+        self.assertEqual(self.station(HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        self.assertEqual(self.bump(self.second_tea).json()['prep_status'], 'preparing')
+        response = self.station(HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['id'] for item in response.json()['items']], [self.second_tea.id, self.first_tea.id])
+
+        self.bump(self.second_tea)
+        self.assertEqual([item['id'] for item in self.station().json()['items']], [self.first_tea.id])
+        self.assertEqual(self.bump(self.second_tea).status_code, 400)
+
+    def test_finished_orders_leave_the_queue(self):
+        stations = self.client.get('/api/kitchen/').json()['stations']
+        self.assertEqual([(station['name'], station['queued']) for station in stations], [('Drinks', 2), ('Mains', 1)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.second.status = 'cancelled'
+            self.second.save()
+        stations = self.client.get('/api/kitchen/').json()['stations']
+        self.assertEqual([(station['name'], station['queued']) for station in stations], [('Drinks', 1)])
+
+
+FIREFOX = 'Mozilla/5.0 (X11; Linux x86_64; rv:120.0) Gecko/20100101 Firefox/120.0'
+
+
+class VisitorLogBufferTests(APITestCase):
+    def setUp(self):
+        # Dimension rows are rolled back between tests, their cached ids aren't
+        user_agent_ids.clear()
+        page_ids.clear()
+
+    def tearDown(self):
+        # Don't leave hourly visit counters behind for the exit flush
+        cache.clear()
+
+    @override_settings(VISITOR_LOG_SYNC=True)
+    def test_sync_mode_writes_during_the_request(self):
+        self.client.get('/', HTTP_USER_AGENT=FIREFOX)
+        self.assertEqual(VisitorLog.objects.get().browser, 'Firefox 120.0')
+
+    @mock.patch('menu.visitors.VISITOR_LOG_FLUSH_MILLISECONDS', 60000)
+    @mock.patch('menu.visitors.VISITOR_LOG_BUFFER_SIZE', 2)
+    def test_full_buffer_drops_rows_and_flush_bulk_creates(self):
+        buffer = VisitorLogBuffer()
+        for _ in range(3):
+            buffer.add(VisitorLog(page_visited='/', user_agent=FIREFOX))
+        self.assertEqual(buffer.stats(), {'buffered': 2, 'written': 0, 'dropped': 1})
+
+        buffer.flush()
+        self.assertEqual(buffer.stats(), {'buffered': 0, 'written': 2, 'dropped': 1})
+        self.assertEqual(VisitorLog.objects.filter(agent__browser='Firefox 120.0').count(), 2)
+
+        # Known user agents and pages resolve from memory: one INSERT per batch
+        for _ in range(2):
+            buffer.add(VisitorLog(page_visited='/', user_agent=FIREFOX))
+        with self.assertNumQueries(1):
+            buffer.flush()
+        self.assertEqual(UserAgent.objects.count(), 1)
+        self.assertEqual(Page.objects.get().visits.count(), 4)
+
+    @mock.patch('menu.visitors.VISITOR_LOG_FLUSH_MILLISECONDS', 10)
+    def test_flusher_thread_survives_an_unexpected_error(self):
+        buffer = VisitorLogBuffer()
+        failed, retried = threading.Event(), threading.Event()
+
+        def flush():
+            if not failed.is_set():
+                failed.set()
+                raise ValueError('unexpected')
+            retried.set()
+
+        buffer.flush = flush
+        with self.assertLogs('menu.visitors', 'ERROR'):
+            buffer.add(VisitorLog(page_visited='/', user_agent=FIREFOX))
+            # Only a thread that outlived the error flushes again
+            self.assertTrue(retried.wait(5))
+
+
+class UserAgentCacheTests(APITestCase):
+    def test_each_user_agent_is_parsed_once(self):
+        cache.clear()
+        chrome = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36'
+        agents = UserAgentCache(maxsize=8, alias='default')
+        for ua_string in (FIREFOX, chrome, FIREFOX, FIREFOX):
+            agents.parse(ua_string)
+        self.assertEqual(agents.parse(chrome).browser, 'Chrome 120.0')
+        self.assertEqual(agents.stats()['parsed'], 2)
+        self.assertEqual(agents.stats()['hits'], 3)
+
+        # Another worker finds them in the shared cache
+        other = UserAgentCache(maxsize=8, alias='default')
+        self.assertEqual(other.parse(FIREFOX).browser, 'Firefox 120.0')
+        self.assertEqual(other.stats()['shared_hits'], 1)
+        self.assertEqual(other.stats()['parsed'], 0)
+
+
+class CachedTokenTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.token = Token.objects.create(user=User.objects.create_user('manager', password='secret'))
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def token_queries(self, method, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url)
+        return response, [q['sql'] for q in queries if 'authtoken_token' in q['sql']]
+
+    def test_token_is_resolved_once_and_evicted_on_logout(self):
+        self.assertEqual(len(self.token_queries('get', '/api/orders/')[1]), 1)
+        response, queries = self.token_queries('get', '/api/orders/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries, [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.post('/api/manager/logout/').status_code, 200)
+        self.assertEqual(self.client.get('/api/orders/').status_code, 401)
+
+    def test_deactivated_user_is_rejected(self):
+        self.client.get('/api/orders/')
+        user = self.token.user
+        user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save()
+        self.assertEqual(self.client.get('/api/orders/').status_code, 401)
+
+
+@override_settings(VISITOR_LOG_SYNC=True, VISITOR_SAMPLE_RATES={'customer': 0.0})
+class VisitorCountTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        user_agent_ids.clear()
+        page_ids.clear()
+        self.client.force_authenticate(User.objects.create_user('manager', password='secret'))
+        self.qr = QRCode.objects.create(table_number='7')
+
+    def tearDown(self):
+        cache.clear()
+
+    def summary(self):
+        return self.client.get('/api/analytics/summary/').json()
+
+    def test_counts_are_exact_while_logs_are_sampled(self):
+        for _ in range(3):
+            self.client.get(f'/?table_uuid={self.qr.uuid}')
+        self.client.get('/')
+        self.assertEqual(VisitorLog.objects.filter(visitor_type='customer').count(), 0)
+        self.assertEqual(self.summary()['total_customers'], 3)
+
+        self.assertEqual(flush_visitor_counts(), 4)
+        self.assertEqual(
+            set(HourlyVisitorCount.objects.values_list('visitor_type', 'table_number', 'visits')),
+            {('customer', '', 3), ('customer', '7', 3), ('anonymous', '', 1)}
+        )
+        # Flushed counts aren't counted twice, and later visits add on
+        self.client.get(f'/?table_uuid={self.qr.uuid}')
+        self.assertEqual(self.summary()['total_customers'], 4)
+        flush_visitor_counts()
+        self.assertEqual(self.summary()['total_customers'], 4)
+
+    def test_flush_reaches_back_to_the_previous_flush(self):
+        now = timezone.now()
+        flush_visitor_counts(now - timedelta(hours=12))
+        record_visit(VisitorLog(visitor_type='customer', timestamp=now - timedelta(hours=11), page_visited='/'))
+        self.assertEqual(flush_visitor_counts(now), 1)
+
+    @override_settings(VISITOR_COUNTS_FLUSH_SECONDS=60)
+    def test_counters_are_flushed_even_when_nothing_is_logged(self):
+        flusher = VisitorCountFlusher()
+        with mock.patch('menu.visitors.time') as clock, \
+                mock.patch('menu.visitors.flush_visitor_counts') as flush:
+            clock.monotonic.side_effect = [0, 30, 61]
+            flusher.maybe_flush()
+            flusher.maybe_flush()
+            self.assertIsNone(flusher._thread)
+            flusher.maybe_flush()
+            flusher._thread.join()
+        flush.assert_called_once_with()
+
+
+@override_settings(REST_FRAMEWORK={
+    **settings.REST_FRAMEWORK,
+    'DEFAULT_THROTTLE_RATES': {'orders_ip': '2/min', 'menu_table': '1/min'},
+    'NUM_PROXIES': 0,
+})
+class ThrottleTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Drinks')
+        self.item = MenuItem.objects.create(name='Tea', price=10, category=category)
+
+    def test_order_placement_is_limited_per_ip(self):
+        payload = {'table_number': '4', 'items': [{'menu_item_id': self.item.id, 'quantity': 1}]}
+        for _ in range(2):
+            self.assertEqual(self.client.post('/api/orders/', payload, format='json').status_code, 201)
+
+        with self.assertNumQueries(0):
+            response = self.client.post('/api/orders/', payload, format='json')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(int(response['Retry-After']), 30)
+        self.assertEqual(rejection_counts(['orders_ip']), {'orders_ip': 1})
+
+        other_client = self.client_class(REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(other_client.post('/api/orders/', payload, format='json').status_code, 201)
+
+    def test_table_menu_is_limited_per_table(self):
+        qr_code = QRCode.objects.create(table_number='7')
+        self.assertEqual(self.client.get(f'/api/menu/{qr_code.uuid}/').status_code, 200)
+        with self.assertNumQueries(0):
+            response = self.client.get(f'/api/menu/{qr_code.uuid}/')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(self.client.get('/api/menu/other/').status_code, 404)
+
+    def test_unknown_table_uuids_share_the_client_ip_bucket(self):
+        self.assertEqual(self.client.get('/api/menu/unknown1/').status_code, 404)
+        self.assertEqual(self.client.get('/api/menu/unknown2/').status_code, 429)
+        other_client = self.client_class(REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(other_client.get('/api/menu/unknown3/').status_code, 404)
+
+    def test_forwarded_for_is_trusted_only_from_configured_proxies(self):
+        payload = {'table_number': '4', 'items': [{'menu_item_id': self.item.id, 'quantity': 1}]}
+
+        def post(forwarded_for):
+            return self.client.post('/api/orders/', payload, format='json', HTTP_X_FORWARDED_FOR=forwarded_for)
+
+        self.assertEqual(post('1.1.1.1').status_code, 201)
+        self.assertEqual(post('2.2.2.2').status_code, 201)
+        self.assertEqual(post('3.3.3.3').status_code, 429)
+
+        with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'NUM_PROXIES': 1}):
+            # Behind one proxy, the entry it appended is the client
+            self.assertEqual(post('127.0.0.1, 10.0.0.9').status_code, 201)
+            self.assertEqual(post('10.0.0.9, 127.0.0.1').status_code, 429)
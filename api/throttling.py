@@ -0,0 +1,114 @@
+import logging
+from django.core.cache import cache
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+from menu.cache import resolve_qr_table
+from menu.utils import get_client_ip
+
+logger = logging.getLogger(__name__)
+
+
+REJECTED_KEY = 'throttle:rejected:{scope}'
+
+
+def record_rejection(scope):
+    key = REJECTED_KEY.format(scope=scope)
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Evicted between add() and incr()
+        cache.set(key, 1, None)
+
+
+def rejection_counts(scopes):
+    counts = cache.get_many([REJECTED_KEY.format(scope=scope) for scope in scopes])
+    return {scope: counts.get(REJECTED_KEY.format(scope=scope), 0) for scope in scopes}
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    """
+    Token bucket kept in the Django cache: a bucket holds up to N tokens
+    for a rate of "N/period", refills at N per period and each request
+    takes one. Bursts up to N are allowed, sustained traffic is held to the
+    rate, and a rejected request gets the exact wait until its next token.
+
+    Rates come from REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'] by ``scope``;
+    a scope without a rate is not throttled. Subclasses say what a bucket
+    is keyed by, and should only reach the database through a cache.
+    """
+    cache_format = 'throttle:%(scope)s:%(ident)s'
+
+    def get_rate(self):
+        # Read at call time so override_settings applies
+        return api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        now = self.timer()
+        refill_rate = self.num_requests / self.duration
+        tokens, updated_at = self.cache.get(self.key, (self.num_requests, now))
+        tokens = min(self.num_requests, tokens + (now - updated_at) * refill_rate)
+
+        if tokens < 1:
+            self.wait_seconds = (1 - tokens) / refill_rate
+            record_rejection(self.scope)
+            logger.info('Throttled %s request for %s', self.scope, self.key)
+            return False
+
+        # A bucket left alone for a full period is full again, so it can expire
+        self.cache.set(self.key, (tokens - 1, now), self.duration)
+        return True
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class TableThrottle(TokenBucketThrottle):
+    """
+    Keyed by the QR table uuid, from the URL or the ``table_uuid`` query
+    parameter. Requests without one are left to the IP throttle. A uuid
+    that is not an active table (resolved through the QR table cache) gets
+    a bucket per client IP instead, so made-up uuids neither get a fresh
+    bucket each nor fill the cache with keys.
+    """
+
+    def get_cache_key(self, request, view):
+        table_uuid = view.kwargs.get('uuid') or request.query_params.get('table_uuid')
+        if not table_uuid:
+            return None
+        table = resolve_qr_table(table_uuid)
+        if table is None or not table.is_active:
+            return self.cache_format % {'scope': self.scope, 'ident': f'ip:{get_client_ip(request)}'}
+        return self.cache_format % {'scope': self.scope, 'ident': table_uuid}
+
+
+class IPThrottle(TokenBucketThrottle):
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': get_client_ip(request)}
+
+
+class OrderTableThrottle(TableThrottle):
+    scope = 'orders_table'
+
+
+class OrderIPThrottle(IPThrottle):
+    scope = 'orders_ip'
+
+
+class MenuTableThrottle(TableThrottle):
+    scope = 'menu_table'
+
+
+class MenuIPThrottle(IPThrottle):
+    scope = 'menu_ip'
+
+
+THROTTLE_SCOPES = [
+    throttle.scope for throttle in (OrderTableThrottle, OrderIPThrottle, MenuTableThrottle, MenuIPThrottle)
+]
@@ -1,9 +1,11 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from api.views import (
-    CategoryViewSet, MenuItemViewSet, OrderViewSet, 
+    CategoryViewSet, MenuItemViewSet, OrderViewSet, OrderItemViewSet,
     QRCodeViewSet, 
-    menu_list, menu_by_uuid, manager_login,
+    menu_list, menu_by_uuid, menu_category_items, menu_search, menu_changes,
+    kitchen_stations, kitchen_station, kitchen_bump,
+    manager_login,
     manager_logout,
     analytics_summary, visitor_logs, activity_logs
 
@@ -13,12 +15,21 @@ router = DefaultRouter()
 router.register(r'categories', CategoryViewSet)
 router.register(r'menu_items', MenuItemViewSet)
 router.register(r'orders', OrderViewSet)
+router.register(r'order_items', OrderItemViewSet)
 router.register(r'qr_codes', QRCodeViewSet)
 
 urlpatterns = [
     path('', include(router.urls)),
     path('menu/', menu_list, name='menu-list'),
+    path('menu/categories/<int:category_id>/items/', menu_category_items, name='menu-category-items'),
+    path('menu/search/', menu_search, name='menu-search'),
+    path('menu/changes/', menu_changes, name='menu-changes'),
     path('menu/<str:uuid>/', menu_by_uuid, name='menu-by-uuid'),
+
+    # Kitchen display
+    path('kitchen/', kitchen_stations, name='kitchen-stations'),
+    path('kitchen/<int:station_id>/', kitchen_station, name='kitchen-station'),
+    path('kitchen/items/<int:item_id>/bump/', kitchen_bump, name='kitchen-bump'),
    
     # Auth
     path('manager/login/', manager_login, name='manager-login'),
@@ -1,3 +1,4 @@
+import time
 import qrcode
 import logging
 import requests
@@ -5,31 +6,64 @@ import cloudinary.uploader
 from io import BytesIO
 from PIL import Image
 from django.conf import settings
-from django.db.models import Case, When, IntegerField
 from rest_framework import viewsets, status
-from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.decorators import (
+    action, api_view, authentication_classes, permission_classes, throttle_classes
+)
 from rest_framework.response import Response
 from rest_framework.authtoken.models import Token
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from django.contrib.auth import authenticate, login
-from django.db.models import Count, Sum, F
-from django.db.models.functions import TruncHour
+from django.db import transaction
+from django.db.models import Count, Sum, F, Q
+from django.db.models.functions import TruncDate, TruncHour
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from datetime import timedelta
 from menu.utils import get_client_ip 
+from menu.search import menu_search_index
+from menu.kitchen import kitchen_queue
+from menu.visitors import pending_visitor_counts, record_visit, visitor_log_buffer
+from menu.cache import page_ids, resolve_qr_table, user_agent_cache, user_agent_ids
+from menu.events import publish_order_events, wait_for_order_events
+from menu.archiving import roll_up_revenue
+from api.idempotency import idempotent_response
+from api.pagination import OrderBoardPagination
+from api.throttling import (
+    THROTTLE_SCOPES, MenuIPThrottle, MenuTableThrottle, OrderIPThrottle, OrderTableThrottle,
+    rejection_counts
+)
+from api.menu_cache import (
+    MENU_PAYLOAD_KEY, TABLE_MENU_PAYLOAD_KEY,
+    MENU_CATEGORY_PAGE_SIZE, MENU_CATEGORY_MAX_PAGE_SIZE,
+    get_menu_data, get_table_menu_data, get_category_page, get_menu_snapshot, use_lazy_menu,
+    get_menu_changes,
+    get_menu_version, get_qr_version, get_category_version, get_menu_payload,
+    get_kitchen_version,
+    make_etag, negotiate_encoding, not_modified_response, payload_response,
+    precompressed_enabled, set_validators
+)
 from menu.models import (
-    Category, MenuItem, Order, QRCode,
-    VisitorLog, ActivityLog, Order, MenuItem
+    Category, MenuItem, Order, OrderItem, QRCode,
+    VisitorLog, ActivityLog, DailyRevenue, HourlyVisitorCount, Order, MenuItem
     )
 from api.serializers import (
-    CategorySerializer, MenuItemSerializer, OrderSerializer, 
-    OrderCreateSerializer, QRCodeSerializer, QRCodeCreateSerializer,
+    CategorySerializer, MenuItemSerializer, MenuItemListSerializer, OrderSerializer,
+    OrderItemSerializer, OrderItemWriteSerializer,
+    OrderCreateSerializer, OrderBulkStatusSerializer, QRCodeSerializer, QRCodeCreateSerializer,
     AnalyticsSummarySerializer, VisitorLogSerializer, ActivityLogSerializer
 )
 
 logger = logging.getLogger(__name__)
 
+# Order delta cursors trail the clock by this much, so an order saved by a
+# transaction that commits just after a poll is still picked up by the next
+ORDER_CURSOR_OVERLAP = getattr(settings, 'ORDER_CURSOR_OVERLAP', timedelta(seconds=5))
+# Clients further behind than this reload the paginated board instead of
+# receiving every order changed since
+ORDER_CHANGES_MAX_AGE = getattr(settings, 'ORDER_CHANGES_MAX_AGE', timedelta(minutes=15))
+
 
 class CategoryViewSet(viewsets.ModelViewSet):
     queryset = Category.objects.all() 
@@ -55,10 +89,15 @@ class CategoryViewSet(viewsets.ModelViewSet):
 
 
 class MenuItemViewSet(viewsets.ModelViewSet):
-    queryset = MenuItem.objects.all()
+    queryset = MenuItem.objects.select_related('category')
     serializer_class = MenuItemSerializer
     permission_classes = [IsAuthenticated]
 
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return MenuItemListSerializer
+        return MenuItemSerializer
+
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context['request'] = self.request
@@ -113,10 +152,19 @@ class MenuItemViewSet(viewsets.ModelViewSet):
             'message': 'Menu item has been marked as inactive.'
         }, status=status.HTTP_204_NO_CONTENT)
 
+def order_status_counts():
+    counts = dict.fromkeys(Order.STATUS_PRIORITY, 0)
+    counts.pop('archived')
+    rows = Order.objects.exclude(status='archived').values('status').annotate(count=Count('id'))
+    counts.update({row['status']: row['count'] for row in rows})
+    return counts
+
+
 class OrderViewSet(viewsets.ModelViewSet):
-    queryset = Order.objects.all().prefetch_related('items')
+    queryset = Order.objects.all().prefetch_related('items__menu_item')
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = OrderBoardPagination
     
     def get_serializer_class(self):
         if self.action == 'create':
@@ -127,27 +175,199 @@ class OrderViewSet(viewsets.ModelViewSet):
         if self.action == 'create':
             return [AllowAny()]
         return [IsAuthenticated()]
+
+    def get_throttles(self):
+        if self.action == 'create':
+            return [OrderTableThrottle(), OrderIPThrottle()]
+        return super().get_throttles()
+
+    def perform_authentication(self, request):
+        # Order placement is public: skip the token/session lookups so the
+        # throttles decide before any database access
+        if self.action != 'create':
+            super().perform_authentication(request)
+
+    def create(self, request, *args, **kwargs):
+        # Retried "Place order" taps replay the first response
+        return idempotent_response(
+            request, 'orders', lambda: super(OrderViewSet, self).create(request, *args, **kwargs)
+        )
     
     def list(self, request):
-        # Custom ordering for status field
-        status_order = Case(
-            When(status='new', then=1),
-            When(status='in_progress', then=2),
-            When(status='pending', then=3),
-            When(status='cancelled', then=4),
-            When(status='completed', then=5),
-            default=6,
-            output_field=IntegerField()
+        if 'updated_since' in request.query_params:
+            return self.list_changes(request)
+
+        # Archived orders rank last, so the live board is a range of the
+        # (status_priority, created_at, id) index
+        cursor = timezone.now() - ORDER_CURSOR_OVERLAP
+        orders = Order.objects.filter(status_priority__lt=Order.STATUS_PRIORITY['archived'])\
+            .prefetch_related('items__menu_item')
+
+        page = self.paginate_queryset(orders)
+        serializer = self.get_serializer(page, many=True)
+        return self.paginator.get_paginated_response(
+            serializer.data, counts=order_status_counts(), cursor=cursor.isoformat()
         )
-        
-        # Filter out 'archived' orders and order by status and created_at
-        orders = Order.objects.exclude(status='archived')\
-            .annotate(status_priority=status_order)\
-            .order_by('status_priority', '-created_at')  # First by status priority, then by date
-        
-        # Use the serializer to convert queryset to JSON
-        serializer = self.get_serializer(orders, many=True)
-        return Response(serializer.data)
+
+    def list_changes(self, request):
+        """
+        Orders changed after ``updated_since``, ids of orders archived since
+        then, and the cursor to pass as ``updated_since`` next time. The
+        first cursor comes from the paginated list. A ``reset`` marker means
+        the cursor is older than ORDER_CHANGES_MAX_AGE and the client must
+        reload the list.
+        """
+        now = timezone.now()
+        cursor = now - ORDER_CURSOR_OVERLAP
+        try:
+            # A "+" in an unencoded UTC offset arrives as a space
+            since = parse_datetime(request.query_params['updated_since'].replace(' ', '+'))
+        except ValueError:  # well formed but out of range, e.g. month 13
+            since = None
+        if since is None:
+            return Response(
+                {'error': 'updated_since must be an ISO 8601 timestamp.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since)
+        if since < now - ORDER_CHANGES_MAX_AGE:
+            return Response({'reset': True})
+
+        changed = Order.all.filter(updated_at__gt=since)
+        orders = changed.filter(is_active=True).exclude(status='archived')\
+            .prefetch_related('items__menu_item')
+        archived = list(
+            changed.filter(Q(is_active=False) | Q(status='archived')).values_list('id', flat=True)
+        )
+
+        return Response({
+            'results': self.get_serializer(orders.order_by('-created_at'), many=True).data,
+            'archived': archived,
+            'counts': order_status_counts(),
+            'cursor': cursor.isoformat(),
+        })
+
+    @action(detail=False, methods=['post'])
+    def bulk_status(self, request):
+        """
+        Move many orders to one status in a single UPDATE, e.g. archiving a
+        shift's completed orders. Orders that don't allow the transition
+        are reported per id and left unchanged.
+        """
+        serializer = OrderBulkStatusSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = list(dict.fromkeys(serializer.validated_data['ids']))
+        new_status = serializer.validated_data['status']
+
+        results = []
+        with transaction.atomic():
+            rows = {
+                row['id']: row for row in Order.objects.select_for_update().filter(id__in=ids)
+                .values('id', 'status', 'total_price', 'created_at')
+            }
+            current = {order_id: row['status'] for order_id, row in rows.items()}
+            allowed = []
+            for order_id in ids:
+                if order_id not in current:
+                    results.append({'id': order_id, 'ok': False, 'error': 'Order not found.'})
+                elif new_status not in Order.STATUS_TRANSITIONS[current[order_id]]:
+                    results.append({
+                        'id': order_id, 'ok': False, 'status': current[order_id],
+                        'error': f"Cannot change a {current[order_id]} order to {new_status}.",
+                    })
+                else:
+                    allowed.append(order_id)
+                    results.append({'id': order_id, 'ok': True, 'status': new_status})
+
+            if allowed:
+                # update() skips save(), so set what it would have set
+                Order.objects.filter(id__in=allowed).update(
+                    status=new_status,
+                    status_priority=Order.STATUS_PRIORITY[new_status],
+                    updated_at=timezone.now()
+                )
+                if new_status == 'archived':
+                    roll_up_revenue([rows[order_id] for order_id in allowed])
+                ActivityLog.objects.bulk_create([
+                    ActivityLog(
+                        activity_type='order_updated',
+                        user=request.user,
+                        ip_address=get_client_ip(request),
+                        details={
+                            'order_id': order_id,
+                            'from_status': current[order_id],
+                            'to_status': new_status,
+                        }
+                    )
+                    for order_id in allowed
+                ])
+                publish_order_events(allowed, 'order_status_changed')
+
+        return Response({'updated': len(allowed), 'results': results})
+
+    @action(detail=False, methods=['get'])
+    def events(self, request):
+        """
+        Long-poll for new orders and status changes for the dashboard:
+        answers as soon as there are events after ``last_event_id``, or
+        with none after ORDER_EVENTS_WAIT_SECONDS. ``reset`` means the
+        client fell too far behind and must reload the board.
+        """
+        last_event_id = request.query_params.get('last_event_id')
+        try:
+            last_event_id = int(last_event_id) if last_event_id else None
+        except ValueError:
+            return Response({'error': 'Invalid last_event_id.'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(wait_for_order_events(last_event_id))
+
+
+class OrderItemViewSet(viewsets.ModelViewSet):
+    """
+    Edit the lines of an open order. Every change moves Order.total_price
+    by its own difference inside the same transaction.
+    """
+    queryset = OrderItem.objects.select_related('menu_item', 'order')
+    serializer_class = OrderItemSerializer
+    permission_classes = [IsAuthenticated]
+    http_method_names = ['get', 'post', 'patch', 'delete', 'head', 'options']
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        order_id = self.request.query_params.get('order')
+        if order_id and order_id.isdigit():
+            queryset = queryset.filter(order_id=order_id)
+        return queryset
+
+    def get_serializer_class(self):
+        if self.action in ('create', 'partial_update'):
+            return OrderItemWriteSerializer
+        return OrderItemSerializer
+
+    def perform_create(self, serializer):
+        line = serializer.save()
+        publish_order_events([line.order_id], 'order_updated')
+
+    def perform_update(self, serializer):
+        line = serializer.save()
+        publish_order_events([line.order_id], 'order_updated')
+
+    def destroy(self, request, *args, **kwargs):
+        line = self.get_object()
+        if line.order.status not in Order.EDITABLE_STATUSES:
+            return Response(
+                {'error': f"Lines of a {line.order.status} order can't be changed."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        with transaction.atomic():
+            current = OrderItem.objects.select_for_update().filter(pk=line.pk)\
+                .values_list('quantity', flat=True).first()
+            if current is not None:
+                OrderItem.objects.filter(pk=line.pk).delete()
+                Order.add_to_total(line.order_id, -line.price_at_order * current)
+                publish_order_events([line.order_id], 'order_updated')
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
 
 class QRCodeViewSet(viewsets.ModelViewSet):
@@ -161,9 +381,15 @@ class QRCodeViewSet(viewsets.ModelViewSet):
         return QRCodeSerializer
 
     def list(self, request):
+        version = get_qr_version()
+        etag = make_etag('qr', version)
+        not_modified = not_modified_response(request, etag, version)
+        if not_modified is not None:
+            return not_modified
+
         qr_codes = QRCode.objects.all().order_by('-created_at')
         serializer = QRCodeSerializer(qr_codes, many=True)
-        return Response(serializer.data)
+        return set_validators(Response(serializer.data), etag, version)
 
     @action(detail=False, methods=['post'])
     def generate(self, request):
@@ -269,23 +495,33 @@ class QRCodeViewSet(viewsets.ModelViewSet):
             )      
 
 @api_view(['GET'])
+@authentication_classes([])
 @permission_classes([AllowAny])
+@throttle_classes([MenuTableThrottle, MenuIPThrottle])
 def menu_by_uuid(request, uuid):
+    # The table number comes from the QR code, so both versions feed the ETag
+    menu_version = get_menu_version()
+    qr_version = get_qr_version()
+    version = max(menu_version, qr_version)
+    lazy = use_lazy_menu(request)
+    shape = 'lazy' if lazy else 'full'
+    encoding = negotiate_encoding(request)
+    etag = make_etag('menu', menu_version, shape, qr_version, uuid, encoding)
+    not_modified = not_modified_response(request, etag, version)
+    if not_modified is not None:
+        return not_modified
+
     try:
-        qr_code = QRCode.objects.get(uuid=uuid)
-        categories = Category.objects.all()
-        menu_items = MenuItem.objects.filter(is_available=True)
-        
-        category_serializer = CategorySerializer(categories, many=True)
-        menu_serializer = MenuItemSerializer(
-            menu_items, many=True, context={'request': request}
-        )
-        
-        return Response({
-            'table_number': qr_code.table_number,
-            'categories': category_serializer.data,
-            'menu_items': menu_serializer.data
-        })
+        if precompressed_enabled():
+            # A cached payload implies the uuid was valid at this QR version
+            key = TABLE_MENU_PAYLOAD_KEY.format(
+                version=menu_version, shape=shape, qr_version=qr_version, uuid=uuid
+            )
+            payload = get_menu_payload(key, lambda: get_table_menu_data(uuid, lazy))
+            return set_validators(payload_response(payload, encoding), etag, version)
+
+        response = Response(get_table_menu_data(uuid, lazy))
+        return set_validators(response, etag, version)
     
     except QRCode.DoesNotExist:
         return Response(
@@ -297,18 +533,167 @@ def menu_by_uuid(request, uuid):
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def menu_list(request):
-    categories = Category.objects.all()
-    menu_items = MenuItem.objects.filter(is_available=True)
-    
-    category_serializer = CategorySerializer(categories, many=True)
-    menu_serializer = MenuItemSerializer(
-        menu_items, many=True, context={'request': request}
-    )
-    
-    return Response({
-        'categories': category_serializer.data,
-        'menu_items': menu_serializer.data
+    version = get_menu_version()
+    lazy = use_lazy_menu(request)
+    shape = 'lazy' if lazy else 'full'
+    encoding = negotiate_encoding(request)
+    etag = make_etag('menu', version, shape, encoding)
+    not_modified = not_modified_response(request, etag, version)
+    if not_modified is not None:
+        return not_modified
+
+    if precompressed_enabled():
+        key = MENU_PAYLOAD_KEY.format(version=version, shape=shape)
+        payload = get_menu_payload(key, lambda: get_menu_data(lazy))
+        return set_validators(payload_response(payload, encoding), etag, version)
+
+    return set_validators(Response(get_menu_data(lazy)), etag, version)
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def menu_category_items(request, category_id):
+    try:
+        cursor = int(request.GET.get('cursor', 0))
+        limit = int(request.GET.get('limit', MENU_CATEGORY_PAGE_SIZE))
+    except ValueError:
+        return Response(
+            {'error': 'cursor and limit must be integers'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    limit = max(1, min(limit, MENU_CATEGORY_MAX_PAGE_SIZE))
+
+    version = get_category_version(category_id)
+    etag = make_etag('category', category_id, version, cursor, limit)
+    not_modified = not_modified_response(request, etag, version)
+    if not_modified is not None:
+        return not_modified
+
+    try:
+        page = get_category_page(category_id, cursor, limit)
+    except Category.DoesNotExist:
+        return Response(
+            {'error': 'Category not found'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    return set_validators(Response(page), etag, version)
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def menu_changes(request):
+    try:
+        since = int(request.GET.get('since', 0))
+    except ValueError:
+        return Response(
+            {'error': 'since must be an integer'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    data = get_menu_changes(since)
+
+    table_uuid = request.GET.get('table_uuid')
+    if table_uuid:
+        qr_table = resolve_qr_table(table_uuid)
+        if qr_table is None:
+            return Response(
+                {'error': 'Invalid QR code'}, 
+                status=status.HTTP_404_NOT_FOUND
+            )
+        data = {'table_number': qr_table.table_number, **data}
+
+    return Response(data)
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def menu_search(request):
+    query = request.GET.get('q', '').strip()
+    try:
+        limit = max(1, min(int(request.GET.get('limit', 20)), 50))
+    except ValueError:
+        return Response(
+            {'error': 'limit must be an integer'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    started = time.perf_counter()
+    menu_search_index.ensure_current(get_menu_version())
+    item_ids = menu_search_index.search(query, limit)
+
+    # Results come from the cached menu snapshot, not the database
+    items_by_id = {item['id']: item for item in get_menu_snapshot()['menu_items']}
+    results = [items_by_id[item_id] for item_id in item_ids if item_id in items_by_id]
+    took_ms = (time.perf_counter() - started) * 1000
+
+    response = Response({
+        'query': query,
+        'count': len(results),
+        'results': results,
+        'took_ms': round(took_ms, 3),
+        'index': menu_search_index.stats(),
     })
+    response['Server-Timing'] = f'search;dur={took_ms:.3f}'
+    return response
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def kitchen_stations(request):
+    kitchen_queue.ensure_current(get_kitchen_version())
+    return Response({'stations': kitchen_queue.stations()})
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def kitchen_station(request, station_id):
+    """
+    The prep queue of one station, served from the in-memory kitchen queue.
+    Display tablets poll this with If-None-Match and get a 304 until
+    something in the kitchen changes.
+    """
+    version = get_kitchen_version()
+    etag = make_etag('kitchen', station_id, version)
+    response = not_modified_response(request, etag, version)
+    if response is not None:
+        return response
+
+    kitchen_queue.ensure_current(version)
+    response = Response({'station': station_id, 'items': kitchen_queue.station(station_id)})
+    return set_validators(response, etag, version)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def kitchen_bump(request, item_id):
+    """
+    Move an order line one prep step along (queued -> preparing -> ready).
+    """
+    line = OrderItem.objects.filter(pk=item_id).values('order_id', 'prep_status').first()
+    if line is None:
+        return Response({'error': 'Order item not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    next_status = OrderItem.NEXT_PREP_STATUS.get(line['prep_status'])
+    if next_status is None:
+        return Response(
+            {'error': f"A {line['prep_status']} item can't be bumped."},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    # Guarded on the status read above, so two cooks bumping the same line
+    # move it one step, not two
+    with transaction.atomic():
+        bumped = OrderItem.objects.filter(pk=item_id, prep_status=line['prep_status'])\
+            .update(prep_status=next_status)
+        if not bumped:
+            return Response(
+                {'error': 'Item was bumped by someone else.'},
+                status=status.HTTP_409_CONFLICT
+            )
+        Order.objects.filter(pk=line['order_id']).update(updated_at=timezone.now())
+        publish_order_events([line['order_id']], 'order_updated')
+
+    return Response({'id': item_id, 'order_id': line['order_id'], 'prep_status': next_status})
 
 
 class CustomAuthToken(ObtainAuthToken):
@@ -347,7 +732,7 @@ def manager_login(request):
     session_id = request.session.session_key if hasattr(request, 'session') else None
 
     if not username or not password:
-        VisitorLog.objects.create(
+        record_visit(VisitorLog(
             visitor_type='anonymous',
             session_id=session_id,
             ip_address=ip,
@@ -355,7 +740,7 @@ def manager_login(request):
             referrer=referrer,
             page_visited='/manager/login - Missing credentials',
             duration=0
-        )
+        ))
         return Response(
             {'detail': 'Username and password are required.'},
             status=status.HTTP_400_BAD_REQUEST
@@ -363,7 +748,7 @@ def manager_login(request):
 
     user = authenticate(username=username, password=password)
     if not user:
-        VisitorLog.objects.create(
+        record_visit(VisitorLog(
             visitor_type='anonymous',
             session_id=session_id,
             ip_address=ip,
@@ -371,7 +756,7 @@ def manager_login(request):
             referrer=referrer,
             page_visited=f'/manager/login - Failed for "{username}"',
             duration=0
-        )
+        ))
         return Response(
             {'detail': 'Invalid credentials.'},
             status=status.HTTP_401_UNAUTHORIZED
@@ -388,7 +773,7 @@ def manager_login(request):
     )
 
     # Track successful login
-    VisitorLog.objects.create(
+    record_visit(VisitorLog(
         visitor_type='manager',
         session_id=f"manager_{user.id}_{token.key[:8]}",
         ip_address=ip,
@@ -396,7 +781,7 @@ def manager_login(request):
         referrer=referrer,
         page_visited='/manager/login - Successful login',
         duration=0
-    )
+    ))
 
     return Response({
         'token': token.key,
@@ -430,20 +815,13 @@ def analytics_summary(request):
     end_date = timezone.now()
     start_date = end_date - timedelta(days=30)
     menu_items = MenuItem.objects.all()
-    # Visitor statistics
-    visitors = VisitorLog.objects.filter(visitor_type='customer', timestamp__range=(start_date, end_date))
-    total_visitors = visitors.count()
     total_items = menu_items.count()
-    total_customers = visitors.filter(visitor_type='customer').count()
-    total_managers = visitors.filter(visitor_type='manager').count()
     
     # Order statistics - only completed orders
     orders = Order.objects.filter(
         created_at__range=(start_date, end_date), 
         status='completed'
     )
-    total_orders = orders.count()
-    total_revenue = orders.aggregate(total=Sum('total_price'))['total'] or 0
     
     # Popular items (aggregated by menu item with sums)
     popular_items = menu_items.filter(
@@ -505,28 +883,58 @@ def analytics_summary(request):
             'quantity': category['total_quantity'] or 0,
         })
     
-    # Revenue data for chart (daily aggregated)
+    # Revenue data for chart (daily aggregated): archived days come from
+    # DailyRevenue, plus completed orders that are still on the board
+    first_day, last_day = timezone.localdate(start_date), timezone.localdate(end_date)
+    daily_totals = {}
+    for day in DailyRevenue.objects.filter(date__range=(first_day, last_day)):
+        daily_totals[day.date] = [day.total_revenue, day.total_orders]
+    live_days = orders.annotate(day=TruncDate('created_at')).values('day').annotate(
+        revenue=Sum('total_price'),
+        order_count=Count('id')
+    )
+    for day in live_days:
+        totals = daily_totals.setdefault(day['day'], [0, 0])
+        totals[0] += day['revenue'] or 0
+        totals[1] += day['order_count']
+
     revenue_data = []
     for i in range(30):
-        date = start_date + timedelta(days=i)
-        daily_data = orders.filter(created_at__date=date).aggregate(
-            revenue=Sum('total_price'),
-            order_count=Count('id')
-        )
+        date = first_day + timedelta(days=i)
+        revenue, order_count = daily_totals.get(date, (0, 0))
         revenue_data.append({
             'date': date.strftime('%Y-%m-%d'),
-            'revenue': float(daily_data['revenue'] or 0),
-            'order_count': daily_data['order_count'] or 0
+            'revenue': float(revenue),
+            'order_count': order_count
         })
+    total_revenue = sum(revenue for revenue, _ in daily_totals.values())
+    total_orders = sum(order_count for _, order_count in daily_totals.values())
     
-    # Visitor data for chart
+    # Visitor statistics from the exact hourly counters (VisitorLog may be
+    # sampled): flushed hours, plus visits still waiting in the cache
+    daily_visits = {}
+    flushed = HourlyVisitorCount.objects.filter(hour__range=(start_date, end_date), table_number='')\
+        .annotate(day=TruncDate('hour')).values('day', 'visitor_type').annotate(visits=Sum('visits'))
+    for row in flushed:
+        daily_visits[row['day'], row['visitor_type']] = row['visits']
+    for (hour, visitor_type), visits in pending_visitor_counts(end_date).items():
+        key = (timezone.localdate(hour), visitor_type)
+        daily_visits[key] = daily_visits.get(key, 0) + visits
+
+    def visits_of(visitor_type):
+        return sum(visits for (_, kind), visits in daily_visits.items() if kind == visitor_type)
+
+    # "Visitors" on the dashboard are customers who scanned a table's QR code
+    total_customers = visits_of('customer')
+    total_visitors = total_customers
+    total_managers = visits_of('manager')
+
     visitor_data = []
     for i in range(30):
-        date = start_date + timedelta(days=i)
-        daily_visitors = visitors.filter(timestamp__date=date).count()
+        date = first_day + timedelta(days=i)
         visitor_data.append({
             'date': date.strftime('%Y-%m-%d'),
-            'visitors': daily_visitors
+            'visitors': daily_visits.get((date, 'customer'), 0)
         })
     
     data = {
@@ -542,6 +950,7 @@ def analytics_summary(request):
         'category_revenue': category_revenue,
         'revenue_data': revenue_data,
         'visitor_data': visitor_data,
+        'throttled_requests': rejection_counts(THROTTLE_SCOPES),
     }
     
     serializer = AnalyticsSummarySerializer(data)
@@ -553,7 +962,8 @@ def visitor_logs(request):
     page = int(request.GET.get('page', 1))
     per_page = int(request.GET.get('per_page', 20))
     
-    visitors = VisitorLog.objects.filter(page_visited__in=['/', '/api/menu/']).order_by('-timestamp')
+    visitors = VisitorLog.objects.filter(page__url__in=['/', '/api/menu/'])\
+        .select_related('agent', 'page', 'referrer_page').order_by('-timestamp')
     total = visitors.count()
     visitors = visitors[(page-1)*per_page:page*per_page]
     
@@ -562,7 +972,11 @@ def visitor_logs(request):
         'total': total,
         'page': page,
         'per_page': per_page,
-        'total_pages': (total + per_page - 1) // per_page
+        'total_pages': (total + per_page - 1) // per_page,
+        # This worker's write-behind buffer; rows it still holds aren't listed
+        'tracking': visitor_log_buffer.stats(),
+        'user_agents': user_agent_cache.stats(),
+        'dimension_ids': {'user_agents': user_agent_ids.stats(), 'pages': page_ids.stats()},
     }
     
     return Response(data)
@@ -573,7 +987,7 @@ def activity_logs(request):
     page = int(request.GET.get('page', 1))
     per_page = int(request.GET.get('per_page', 20))
     
-    activities = ActivityLog.objects.all().order_by('-timestamp')
+    activities = ActivityLog.objects.select_related('user').order_by('-timestamp')
     total = activities.count()
     activities = activities[(page-1)*per_page:page*per_page]
     
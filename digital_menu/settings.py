@@ -85,6 +85,19 @@ else:
     }
 
 
+# Menu/kitchen versions, cached tokens, throttle buckets and visitor
+# counters must be seen by every worker, so production needs a shared
+# cache (``manage.py check --deploy`` enforces it). Without REDIS_URL each process keeps its
+# own LocMem cache, which only suits a single-process development server.
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -123,7 +136,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
@@ -131,11 +144,36 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 50,
+    # Proxies in front of the app whose X-Forwarded-For entries are trusted
+    # (menu.utils.get_client_ip); the hosted deployment sits behind one
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', '0' if DEBUG else '1')),
+    # Token buckets for the public endpoints (api/throttling.py): bursts up
+    # to N, refilled at N per period
+    'DEFAULT_THROTTLE_RATES': {
+        'orders_table': os.getenv('THROTTLE_ORDERS_TABLE', '10/min'),
+        'orders_ip': os.getenv('THROTTLE_ORDERS_IP', '30/min'),
+        'menu_table': os.getenv('THROTTLE_MENU_TABLE', '120/min'),
+        'menu_ip': os.getenv('THROTTLE_MENU_IP', '300/min'),
+    },
 }
 
 # Frontend URL for QR code generation
 FRONTEND_URL = os.getenv('FRONTEND_URL', default='http://localhost:8000')
 
+# Write visitor rows in the request thread instead of batching them (tests)
+VISITOR_LOG_SYNC = os.getenv('VISITOR_LOG_SYNC', 'False') == 'True'
+
+# Share of visits logged to VisitorLog per visitor type; the hourly visitor
+# counters behind the analytics totals count every visit regardless
+VISITOR_SAMPLE_RATES = {
+    'customer': float(os.getenv('VISITOR_SAMPLE_CUSTOMER', '1.0')),
+    'anonymous': float(os.getenv('VISITOR_SAMPLE_ANONYMOUS', '1.0')),
+    'manager': float(os.getenv('VISITOR_SAMPLE_MANAGER', '1.0')),
+}
+
+# Serve the public menu as JSON rendered and compressed once per menu version
+MENU_PRECOMPRESSED = os.getenv('MENU_PRECOMPRESSED', 'True') == 'True'
+
 if DEBUG:
     DEFAULT_FILE_STORAGE = 'django.core.files.storage.FileSystemStorage'
 else:
@@ -156,9 +194,9 @@ SUPERUSER_PASSWORD = os.getenv('SUPERUSER_PASSWORD', 'admin')
 
 # User agents cache
 USER_AGENTS_CACHE = 'default'
-MIDDLEWARE.insert(-1, 'django_user_agents.middleware.UserAgentMiddleware')
+MIDDLEWARE.insert(-1, 'menu.middleware.UserAgentMiddleware')
 MIDDLEWARE.insert(-1, 'menu.middleware.VisitorTrackingMiddleware')
 
 CORS_ALLOW_CREDENTIALS = True
-CORS_ALLOW_HEADERS = ['Authorization', 'Content-Type', 'X-CSRFToken']
+CORS_ALLOW_HEADERS = ['Authorization', 'Content-Type', 'X-CSRFToken', 'Idempotency-Key']
 MIDDLEWARE.insert(0, 'corsheaders.middleware.CorsMiddleware')
@@ -0,0 +1,19 @@
+import os
+
+# Threaded workers. A dashboard's order-event long-poll holds a thread for
+# up to ORDER_EVENTS_WAIT_SECONDS (menu/events.py), so with gunicorn's
+# default single sync worker one open dashboard would stall every other
+# request. Concurrency budget: WEB_CONCURRENCY x GUNICORN_THREADS requests
+# at once. Leave one thread per open dashboard on top of the customer
+# traffic a worker should absorb, e.g. 2 x 8 serves 4 dashboards with 12
+# threads to spare. Each thread keeps its own database connection, so the
+# database must accept that many connections per instance.
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+
+
+def worker_exit(server, worker):
+    # Write the visitor rows this worker still holds in its buffer
+    from menu.visitors import visitor_log_buffer
+    visitor_log_buffer.flush()
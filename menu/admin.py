@@ -34,6 +34,11 @@ class OrderAdmin(admin.ModelAdmin):
     search_fields = ['table_number']
     inlines = [OrderItemInline]
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # Lines edited inline change the total
+        form.instance.update_total()
+
 @admin.register(QRCode)
 class QRCodeAdmin(admin.ModelAdmin):
     list_display = ['table_number', 'uuid', 'created_at']
@@ -43,6 +48,8 @@ class QRCodeAdmin(admin.ModelAdmin):
 @admin.register(VisitorLog)
 class VisitorLogAdmin(admin.ModelAdmin):
     list_display = ['visitor_type', 'user_agent', 'page_visited', 'timestamp']
+    list_select_related = ['agent', 'page']
+    raw_id_fields = ['agent', 'page', 'referrer_page']
     search_fields = ['visitor_type']
     list_per_page = 30
 @admin.register(ActivityLog)
@@ -6,4 +6,5 @@ class MenuConfig(AppConfig):
     name = "menu"
     
     def ready(self):
+        import menu.checks
         import menu.signals
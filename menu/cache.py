@@ -0,0 +1,192 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from hashlib import md5
+from django.conf import settings
+from django.core.cache import caches
+from user_agents import parse
+from .models import Page, QRCode, UserAgent
+
+
+class LRUCache:
+    """
+    Small thread-safe, per-process LRU with a time-to-live on each entry.
+    """
+
+    def __init__(self, maxsize=128, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires is None or expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+        }
+
+
+QRTable = namedtuple('QRTable', ['id', 'table_number', 'is_active'])
+
+# Other workers only see QR edits once their entry expires, hence the short TTL
+qr_table_cache = LRUCache(
+    maxsize=getattr(settings, 'QR_CACHE_SIZE', 512),
+    ttl=getattr(settings, 'QR_CACHE_TTL', 300),
+)
+
+
+def resolve_qr_table(uuid):
+    """
+    Map a QR uuid to its ``QRTable``, or None when no such QR code exists.
+    Unknown uuids are not cached so a freshly created code resolves at once.
+    """
+    table = qr_table_cache.get(uuid)
+    if table is None:
+        row = QRCode.objects.filter(uuid=uuid).values_list(
+            'id', 'table_number', 'is_active'
+        ).first()
+        if row is None:
+            return None
+        table = QRTable(*row)
+        qr_table_cache.set(uuid, table)
+    return table
+
+
+def invalidate_qr_table(uuid):
+    qr_table_cache.delete(uuid)
+
+
+UserAgentInfo = namedtuple('UserAgentInfo', ['browser', 'os', 'device'])
+
+
+def user_agent_digest(ua_string):
+    return md5(ua_string.encode()).hexdigest()
+
+
+UNKNOWN_USER_AGENT = UserAgentInfo('Unknown', 'Unknown', 'Unknown')
+
+
+class UserAgentCache:
+    """
+    Memoized user agent parsing: maps a User-Agent header to its
+    ``UserAgentInfo``. A per-process LRU sits in front of the shared
+    ``USER_AGENTS_CACHE`` cache, and only a miss in both runs the parser's
+    regexes. Parsed results never change, so entries need no invalidation.
+    """
+    key_format = 'ua:{digest}'
+
+    def __init__(self, maxsize, alias=None, timeout=None):
+        self.local = LRUCache(maxsize=maxsize)
+        self.shared = caches[alias] if alias else None
+        self.timeout = timeout
+        self.shared_hits = 0
+        self.parsed = 0
+
+    def parse(self, ua_string):
+        info = self.local.get(ua_string)
+        if info is not None:
+            return info
+
+        key = self.key_format.format(digest=user_agent_digest(ua_string))
+        cached = self.shared.get(key) if self.shared else None
+        if cached is not None:
+            self.shared_hits += 1
+            info = UserAgentInfo(*cached)
+        else:
+            self.parsed += 1
+            info = self._parse(ua_string)
+            if self.shared:
+                self.shared.set(key, tuple(info), self.timeout)
+        self.local.set(ua_string, info)
+        return info
+
+    def _parse(self, ua_string):
+        try:
+            ua = parse(ua_string)
+            return UserAgentInfo(
+                f"{ua.browser.family} {ua.browser.version_string}",
+                f"{ua.os.family} {ua.os.version_string}",
+                ua.device.family,
+            )
+        except Exception:
+            # If user agent parsing fails, still save the record
+            return UNKNOWN_USER_AGENT
+
+    def stats(self):
+        return {**self.local.stats(), 'shared_hits': self.shared_hits, 'parsed': self.parsed}
+
+
+# A venue sees a few hundred distinct user agents a day
+user_agent_cache = UserAgentCache(
+    maxsize=getattr(settings, 'USER_AGENT_CACHE_SIZE', 1024),
+    alias=getattr(settings, 'USER_AGENTS_CACHE', None),
+    timeout=getattr(settings, 'USER_AGENT_CACHE_TTL', 24 * 60 * 60),
+)
+
+
+# Visitor dimension rows are only ever added, so a cached id never goes stale
+user_agent_ids = LRUCache(maxsize=getattr(settings, 'USER_AGENT_CACHE_SIZE', 1024))
+page_ids = LRUCache(maxsize=getattr(settings, 'PAGE_CACHE_SIZE', 4096))
+
+
+def resolve_user_agent(ua_string):
+    """
+    Id of the ``UserAgent`` row for ``ua_string``, created and parsed the
+    first time the string is seen; None for an empty string.
+    """
+    if not ua_string:
+        return None
+    agent_id = user_agent_ids.get(ua_string)
+    if agent_id is None:
+        agent_id = UserAgent.objects.get_or_create(
+            digest=user_agent_digest(ua_string),
+            defaults={'user_agent': ua_string, **user_agent_cache.parse(ua_string)._asdict()},
+        )[0].id
+        user_agent_ids.set(ua_string, agent_id)
+    return agent_id
+
+
+def resolve_page(url):
+    url = url[:Page._meta.get_field('url').max_length]
+    page_id = page_ids.get(url)
+    if page_id is None:
+        page_id = Page.objects.get_or_create(url=url)[0].id
+        page_ids.set(url, page_id)
+    return page_id
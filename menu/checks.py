@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+
+# Backends whose entries only the process that wrote them can see
+PER_PROCESS_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Menu and kitchen versions, the change journal cursor, cached tokens and
+    the visitor counters all live in the default cache. With a per-process
+    backend every worker has its own copy, so edits and logouts on one
+    worker go unseen by the others and counters die with their worker.
+    """
+    backend = settings.CACHES['default']['BACKEND']
+    if backend in PER_PROCESS_CACHES:
+        return [Error(
+            f'The default cache ({backend}) is not shared between worker processes.',
+            hint='Set REDIS_URL, or configure another shared cache as CACHES["default"].',
+            id='menu.E001',
+        )]
+    return []
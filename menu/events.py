@@ -0,0 +1,233 @@
+import logging
+import queue
+import threading
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction, DatabaseError
+from django.db.models import Max
+from django.dispatch import Signal
+from django.utils import timezone
+from api.serializers import OrderSerializer
+from .models import Order, OrderEvent
+
+logger = logging.getLogger(__name__)
+
+# Sent after commit with the changed orders (lines and menu items
+# prefetched), for every path that publishes order events, including the
+# queryset updates that skip post_save
+order_changed = Signal()
+
+
+# How often each worker tails the event table, and how long a long-poll
+# waits for an event before answering empty. The wait stays well under
+# gunicorn's 30 second worker timeout.
+ORDER_EVENTS_POLL_SECONDS = getattr(settings, 'ORDER_EVENTS_POLL_SECONDS', 1.0)
+ORDER_EVENTS_WAIT_SECONDS = getattr(settings, 'ORDER_EVENTS_WAIT_SECONDS', 20)
+# Older events are deleted by the purge_order_events command
+ORDER_EVENTS_RETENTION = getattr(settings, 'ORDER_EVENTS_RETENTION', timedelta(hours=1))
+ORDER_EVENTS_BATCH_SIZE = 500
+# Events a waiting request may fall behind by before it is told to reload
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+
+def serialize_event(event):
+    return {
+        'id': event.id,
+        'type': event.event_type,
+        'order': event.payload,
+    }
+
+
+class OrderEventHub:
+    """
+    Per-process fan-out of order events to waiting dashboard long-polls.
+
+    One poller thread per worker reads new ``OrderEvent`` rows and copies
+    them into every subscriber's queue, so an order saved on any worker
+    reaches the requests waiting on all of them. The poller only runs
+    while at least one request is waiting.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._wake = threading.Event()
+        self._thread = None
+        self.last_id = None
+        self.dropped = 0
+
+    def subscribe(self):
+        subscriber = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.add(subscriber)
+            if self._thread is None:
+                self.last_id = latest_event_id()
+                self._thread = threading.Thread(
+                    target=self._run, name='order-event-hub', daemon=True
+                )
+                self._thread.start()
+            return subscriber, self.last_id
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def is_subscribed(self, subscriber):
+        with self._lock:
+            return subscriber in self._subscribers
+
+    def wake(self):
+        """
+        Poll immediately, e.g. right after this worker wrote an event.
+        """
+        self._wake.set()
+
+    def publish(self, events):
+        # Advance last_id under the same lock as delivery, so a request that
+        # subscribes mid-poll either receives these events or replays them
+        with self._lock:
+            for subscriber in list(self._subscribers):
+                try:
+                    for event in events:
+                        subscriber.put_nowait(event)
+                except queue.Full:
+                    # The request notices it was dropped and asks the client to reload
+                    self.dropped += 1
+                    self._subscribers.discard(subscriber)
+            if events:
+                self.last_id = events[-1]['id']
+
+    def _run(self):
+        try:
+            while True:
+                with self._lock:
+                    if not self._subscribers:
+                        self._thread = None
+                        return
+                self.publish(self._poll())
+                self._wake.wait(ORDER_EVENTS_POLL_SECONDS)
+                self._wake.clear()
+        finally:
+            connection.close()
+
+    def _poll(self):
+        close_old_connections()
+        try:
+            events = OrderEvent.objects.filter(id__gt=self.last_id or 0)\
+                .order_by('id')[:ORDER_EVENTS_BATCH_SIZE]
+            return [serialize_event(event) for event in events]
+        except DatabaseError:
+            logger.exception('Order event poll failed')
+            return []
+
+
+order_event_hub = OrderEventHub()
+
+
+def latest_event_id():
+    return OrderEvent.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+
+
+def replay_order_events(after):
+    """
+    The events recorded after id ``after``, a ``reset`` answer when there
+    are too many to replay, or None when there are none.
+    """
+    events = list(
+        OrderEvent.objects.filter(id__gt=after).order_by('id')[:ORDER_EVENTS_BATCH_SIZE + 1]
+    )
+    if not events:
+        return None
+    if len(events) > ORDER_EVENTS_BATCH_SIZE:
+        # Too far behind to replay; the client reloads the full list
+        return {'reset': True, 'last_event_id': latest_event_id()}
+    events = [serialize_event(event) for event in events]
+    return {'events': events, 'last_event_id': events[-1]['id']}
+
+
+def wait_for_order_events(last_event_id=None, wait=ORDER_EVENTS_WAIT_SECONDS):
+    """
+    Long-poll for new orders and status changes.
+
+    Events already recorded after ``last_event_id`` are returned at once,
+    straight from the table. Otherwise the request waits on the hub for up
+    to ``wait`` seconds and returns the first events to arrive, or none.
+    Without ``last_event_id`` it waits for events after the latest one.
+    Clients pass the returned ``last_event_id`` on their next call.
+    """
+    if last_event_id is not None:
+        replayed = replay_order_events(last_event_id)
+        if replayed is not None:
+            return replayed
+
+    subscriber, hub_last_id = order_event_hub.subscribe()
+    try:
+        sent_id = hub_last_id if last_event_id is None else last_event_id
+        if sent_id > hub_last_id:
+            # A cursor from before the event table was emptied
+            return {'reset': True, 'last_event_id': hub_last_id}
+        if sent_id < hub_last_id:
+            # Recorded between the replay above and subscribing
+            replayed = replay_order_events(sent_id)
+            if replayed is not None:
+                return replayed
+
+        events = []
+        deadline = time.monotonic() + wait
+        while not events:
+            if not order_event_hub.is_subscribed(subscriber):
+                return {'reset': True, 'last_event_id': latest_event_id()}
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                event = subscriber.get(timeout=remaining)
+            except queue.Empty:
+                break
+            # Take whatever else arrived with it
+            batch = [event]
+            while True:
+                try:
+                    batch.append(subscriber.get_nowait())
+                except queue.Empty:
+                    break
+            events = [event for event in batch if event['id'] > sent_id]
+        return {'events': events, 'last_event_id': events[-1]['id'] if events else sent_id}
+    finally:
+        order_event_hub.unsubscribe(subscriber)
+
+
+def purge_order_events():
+    """
+    Delete the events older than ORDER_EVENTS_RETENTION; returns how many.
+    """
+    deleted, _ = OrderEvent.objects.filter(
+        created_at__lt=timezone.now() - ORDER_EVENTS_RETENTION
+    ).delete()
+    return deleted
+
+
+def publish_order_event(order_id, event_type):
+    publish_order_events([order_id], event_type)
+
+
+def publish_order_events(order_ids, event_type):
+    """
+    Record order events once the surrounding transaction commits, so the
+    payload includes order lines that are bulk-created after the order row.
+    The order is already committed by then, so a failure here is logged
+    rather than turned into an error response the client would retry.
+    """
+    def record():
+        orders = list(
+            Order.all.filter(pk__in=order_ids).prefetch_related('items__menu_item__category')
+        )
+        OrderEvent.objects.bulk_create([
+            OrderEvent(event_type=event_type, order_id=order.id, payload=OrderSerializer(order).data)
+            for order in orders
+        ])
+        order_event_hub.wake()
+        order_changed.send(sender=Order, orders=orders)
+
+    transaction.on_commit(record, robust=True)
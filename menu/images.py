@@ -0,0 +1,81 @@
+import base64
+import os
+from io import BytesIO
+import cloudinary
+from cloudinary.utils import cloudinary_url
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageFilter, ImageOps
+
+
+# Widths the customer menu asks for: grid thumbnails, cards and the item modal
+IMAGE_VARIANT_WIDTHS = {
+    'thumbnail': 160,
+    'card': 480,
+    'detail': 1080,
+}
+PLACEHOLDER_WIDTH = 16
+LOCAL_VARIANT_DIR = 'menu_items/variants'
+
+
+def cloudinary_configured():
+    return bool(cloudinary.config().cloud_name)
+
+
+def https_url(url):
+    return url.replace('http://', 'https://', 1) if url.startswith('http://') else url
+
+
+def make_placeholder(image):
+    """
+    Return a tiny blurred JPEG of ``image`` as a data URI, small enough to be
+    inlined in the menu payload and shown while the real image loads.
+    """
+    height = max(1, round(image.height * PLACEHOLDER_WIDTH / image.width))
+    thumb = image.resize((PLACEHOLDER_WIDTH, height), Image.BILINEAR)
+    thumb = thumb.filter(ImageFilter.GaussianBlur(1))
+    buffer = BytesIO()
+    thumb.save(buffer, format='JPEG', quality=40)
+    return 'data:image/jpeg;base64,' + base64.b64encode(buffer.getvalue()).decode('ascii')
+
+
+def save_local_variant(image, stem, name, width):
+    variant = image.copy()
+    variant.thumbnail((width, width * 10), Image.LANCZOS)
+    buffer = BytesIO()
+    variant.save(buffer, format='WEBP', quality=80)
+    path = default_storage.save(
+        f'{LOCAL_VARIANT_DIR}/{stem}_{name}.webp', ContentFile(buffer.getvalue())
+    )
+    return default_storage.url(path)
+
+
+def build_image_variants(source, public_id=None, original_url=None):
+    """
+    Build the responsive variants for an uploaded menu image.
+
+    With a Cloudinary ``public_id`` the variants are transformation URLs;
+    otherwise resized copies are written to the default file storage. The
+    returned dict is stored on ``MenuItem.image_variants`` as-is.
+    """
+    image = ImageOps.exif_transpose(Image.open(source)).convert('RGB')
+    stem = os.path.splitext(os.path.basename(getattr(source, 'name', '') or 'image'))[0]
+
+    variants = {'placeholder': make_placeholder(image)}
+    srcset = []
+    for name, width in IMAGE_VARIANT_WIDTHS.items():
+        width = min(width, image.width)
+        if public_id:
+            url = cloudinary_url(
+                public_id, width=width, crop='limit',
+                quality='auto', fetch_format='auto', secure=True
+            )[0]
+        else:
+            url = save_local_variant(image, stem, name, width)
+        variants[name] = url
+        if not any(entry.endswith(f' {width}w') for entry in srcset):
+            srcset.append(f'{url} {width}w')
+
+    variants['srcset'] = ', '.join(srcset)
+    variants['original'] = https_url(original_url) if original_url else variants['detail']
+    return variants
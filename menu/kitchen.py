@@ -0,0 +1,128 @@
+import threading
+from collections import defaultdict
+from .models import Order, OrderItem
+
+
+# Lines a cook is working on come before ones still waiting
+PREP_PRIORITY = {'preparing': 0, 'queued': 1}
+
+
+class KitchenQueue:
+    """
+    Per-process queue of the order lines the kitchen still has to make.
+
+    Lines of open orders are grouped into stations by menu category and
+    kept in prep order: lines being prepared first, then the oldest order,
+    then line id. Each station's sorted view is built once and reused
+    until one of its lines changes, so display tablets polling a station
+    read a ready-made list. ``version`` records the kitchen version the
+    queue reflects so changes made by other workers trigger a rebuild.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+        self.version = None
+
+    def _reset(self):
+        self.lines = {}
+        self.order_lines = defaultdict(set)
+        self.station_lines = defaultdict(dict)
+        self.station_names = {}
+        self._views = {}
+
+    def rebuild(self, version=None):
+        lines = OrderItem.objects.filter(
+            order__status__in=Order.EDITABLE_STATUSES, order__is_active=True
+        ).exclude(prep_status='ready').select_related('order', 'menu_item__category')
+        with self._lock:
+            self._reset()
+            for line in lines:
+                self._add(line, line.order)
+            self.version = version
+
+    def update_orders(self, orders, version=None):
+        """
+        Replace the lines of ``orders`` (with ``items__menu_item__category``
+        prefetched) after they changed. Does nothing until the queue has
+        been built; the first read builds it from scratch.
+        """
+        with self._lock:
+            if self.version is None:
+                return
+            for order in orders:
+                self._remove_order(order.id)
+                if order.is_active and order.status in Order.EDITABLE_STATUSES:
+                    for line in order.items.all():
+                        if line.prep_status != 'ready':
+                            self._add(line, order)
+            self.version = version
+
+    def remove_order(self, order_id, version=None):
+        with self._lock:
+            if self.version is None:
+                return
+            self._remove_order(order_id)
+            self.version = version
+
+    def invalidate(self):
+        with self._lock:
+            self.version = None
+
+    def ensure_current(self, version):
+        if self.version != version:
+            self.rebuild(version)
+
+    def _add(self, line, order):
+        category = line.menu_item.category
+        entry = {
+            'id': line.id,
+            'order_id': order.id,
+            'table_number': order.table_number,
+            'name': line.menu_item.name,
+            'quantity': line.quantity,
+            'prep_status': line.prep_status,
+            'order_status': order.status,
+            'created_at': order.created_at.isoformat(),
+        }
+        sort_key = (PREP_PRIORITY[line.prep_status], order.created_at, line.id)
+        self.lines[line.id] = self.station_lines[category.id][line.id] = (category.id, entry, sort_key)
+        self.order_lines[order.id].add(line.id)
+        self.station_names[category.id] = category.name
+        self._views.pop(category.id, None)
+
+    def _remove_order(self, order_id):
+        for line_id in self.order_lines.pop(order_id, ()):
+            station_id = self.lines.pop(line_id)[0]
+            station = self.station_lines[station_id]
+            del station[line_id]
+            if not station:
+                del self.station_lines[station_id]
+            self._views.pop(station_id, None)
+
+    def station(self, station_id):
+        """
+        The sorted lines of one station, or an empty list when nothing is
+        waiting there. The list is shared; callers must not change it.
+        """
+        with self._lock:
+            if station_id not in self.station_lines:
+                return []
+            view = self._views.get(station_id)
+            if view is None:
+                lines = sorted(self.station_lines[station_id].values(), key=lambda line: line[2])
+                view = self._views[station_id] = [entry for _, entry, _ in lines]
+            return view
+
+    def stations(self):
+        with self._lock:
+            summary = []
+            for station_id, lines in self.station_lines.items():
+                counts = {'queued': 0, 'preparing': 0}
+                for _, entry, _ in lines.values():
+                    counts[entry['prep_status']] += 1
+                summary.append({'id': station_id, 'name': self.station_names[station_id], **counts})
+            return sorted(summary, key=lambda station: station['name'])
+
+
+kitchen_queue = KitchenQueue()
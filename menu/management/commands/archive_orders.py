@@ -0,0 +1,38 @@
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from menu.archiving import ORDER_ARCHIVE_AFTER_DAYS, archive_order_chunk
+
+
+class Command(BaseCommand):
+    help = 'Archive old completed/cancelled orders and roll their revenue into DailyRevenue'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=ORDER_ARCHIVE_AFTER_DAYS,
+            help='Archive orders created more than this many days ago'
+        )
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        archived = completed = chunks = 0
+
+        start = time.perf_counter()
+        while True:
+            chunk_archived, chunk_completed = archive_order_chunk(cutoff, options['chunk_size'])
+            if not chunk_archived:
+                break
+            archived += chunk_archived
+            completed += chunk_completed
+            chunks += 1
+            if options['verbosity'] > 1:
+                self.stdout.write(f'Chunk {chunks}: archived {chunk_archived} orders')
+        elapsed = time.perf_counter() - start
+
+        rate = archived / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {archived} orders ({completed} completed) in {chunks} chunks, '
+            f'{elapsed:.2f}s, {rate:.0f} rows/s'
+        ))
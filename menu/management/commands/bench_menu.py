@@ -0,0 +1,66 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client
+from django.test.utils import override_settings
+from menu.models import Category, MenuItem, QRCode
+from api.menu_cache import bump_menu_version
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the public menu endpoints (runs in a rolled-back transaction)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=300)
+        parser.add_argument('--categories', type=int, default=10)
+        parser.add_argument('--requests', type=int, default=200)
+
+    def handle(self, *args, **options):
+        # Measure the endpoint, not the throttles
+        unthrottled = {**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {}}
+        with transaction.atomic(), override_settings(REST_FRAMEWORK=unthrottled):
+            qr_code = self.create_menu(options['items'], options['categories'])
+            client = Client(HTTP_ACCEPT_ENCODING='gzip, deflate, br')
+            # The full menu is what the snapshots and precompression serve
+            url = f'/api/menu/{qr_code.uuid}/?lazy=0'
+
+            scenarios = [
+                # Every request rebuilds the payload, as before snapshots existed
+                ('uncached', False, True),
+                ('snapshot', False, False),
+                ('precompressed', True, False),
+            ]
+            for name, precompressed, rebuild in scenarios:
+                with override_settings(MENU_PRECOMPRESSED=precompressed):
+                    rate, size = self.run(client, url, options['requests'], rebuild)
+                self.stdout.write(f'{name:>14}: {rate:8.1f} req/s  {size:>8} bytes')
+
+            transaction.set_rollback(True)
+
+    def create_menu(self, item_count, category_count):
+        categories = Category.objects.bulk_create([
+            Category(name=f'Bench category {i}') for i in range(category_count)
+        ])
+        MenuItem.objects.bulk_create([
+            MenuItem(
+                name=f'Bench item {i}',
+                description='A long description of the dish and its sides. ' * 4,
+                price=100 + i,
+                category=categories[i % category_count],
+            )
+            for i in range(item_count)
+        ])
+        # bulk_create skips the signals that normally invalidate the snapshot
+        bump_menu_version()
+        return QRCode.objects.create(table_number='Bench table')
+
+    def run(self, client, url, count, rebuild):
+        client.get(url)  # warm up
+        start = time.perf_counter()
+        for _ in range(count):
+            if rebuild:
+                bump_menu_version()
+            response = client.get(url)
+        elapsed = time.perf_counter() - start
+        return count / elapsed, len(response.content)
@@ -0,0 +1,70 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+from menu.models import ActivityLog, Category, MenuItem, Order, OrderEvent
+
+
+class Command(BaseCommand):
+    help = 'Benchmark order placement (each order commits; the bench rows are deleted afterwards)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', type=int, default=20)
+        parser.add_argument('--orders', type=int, default=200)
+
+    def handle(self, *args, **options):
+        # Measure order placement, not the throttles
+        unthrottled = {**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {}}
+        category = Category.objects.create(name='Bench category')
+        menu_items = MenuItem.objects.bulk_create([
+            MenuItem(name=f'Bench item {i}', price=100 + i, category=category)
+            for i in range(options['lines'])
+        ])
+        try:
+            with override_settings(REST_FRAMEWORK=unthrottled):
+                self.run(menu_items, options['orders'])
+        finally:
+            self.clean_up(category, menu_items)
+
+    def run(self, menu_items, count):
+        payload = {
+            'table_number': 'Bench table',
+            'items': [{'menu_item_id': item.id, 'quantity': 2} for item in menu_items],
+        }
+        client = Client()
+
+        # Outside a transaction every order commits, so the on_commit work
+        # is part of what gets timed
+        client.post('/api/orders/', payload, content_type='application/json')  # warm up
+        # Count with a wrapper; the request cycle resets connection.queries
+        queries = []
+
+        def count_queries(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count_queries):
+            client.post('/api/orders/', payload, content_type='application/json')
+
+        start = time.perf_counter()
+        for _ in range(count):
+            client.post('/api/orders/', payload, content_type='application/json')
+        elapsed = time.perf_counter() - start
+
+        self.stdout.write(
+            f"{len(menu_items)}-line orders: {count / elapsed:.1f} orders/s, "
+            f"{elapsed / count * 1000:.2f} ms/order, {len(queries)} queries/order"
+        )
+
+    def clean_up(self, category, menu_items):
+        order_ids = list(
+            Order.all.filter(items__menu_item__in=menu_items).distinct().values_list('id', flat=True)
+        )
+        item_ids = [item.id for item in menu_items]
+        OrderEvent.objects.filter(order_id__in=order_ids).delete()
+        Order.all.filter(id__in=order_ids).delete()
+        category.delete()
+        ActivityLog.objects.filter(activity_type='order_placed', details__order_id__in=order_ids).delete()
+        ActivityLog.objects.filter(activity_type='item_deleted', details__item_id__in=item_ids).delete()
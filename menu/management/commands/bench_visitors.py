@@ -0,0 +1,139 @@
+import random
+import time
+import uuid
+from django.apps.registry import Apps
+from django.core.management.base import BaseCommand
+from django.db import connection, models, transaction
+from django.utils import timezone
+from menu.cache import page_ids, user_agent_ids
+from menu.models import Page, UserAgent, VisitorLog
+
+# The visitor table as it was before the UserAgent/Page dimensions, in its
+# own registry so it never shows up in migrations
+legacy_apps = Apps()
+
+
+class LegacyVisitorLog(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4)
+    visitor_type = models.CharField(max_length=10, default='anonymous')
+    session_id = models.CharField(max_length=100, blank=True, null=True)
+    ip_address = models.GenericIPAddressField(null=True, blank=True)
+    user_agent = models.TextField(blank=True)
+    browser = models.CharField(max_length=100, blank=True)
+    os = models.CharField(max_length=100, blank=True)
+    device = models.CharField(max_length=100, blank=True)
+    referrer = models.URLField(blank=True)
+    page_visited = models.CharField(max_length=200)
+    table_number = models.CharField(max_length=50, blank=True, null=True)
+    timestamp = models.DateTimeField(default=timezone.now)
+    duration = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        apps = legacy_apps
+        app_label = 'menu'
+        db_table = 'bench_legacy_visitorlog'
+
+
+def table_bytes(*tables):
+    """
+    On-disk size of ``tables`` with their indexes, or None where the
+    database can't tell.
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                'SELECT SUM(pg_total_relation_size(t::regclass)) FROM unnest(%s) AS t', [list(tables)]
+            )
+        elif connection.vendor == 'sqlite':
+            placeholders = ', '.join(['%s'] * len(tables))
+            try:
+                cursor.execute(
+                    'SELECT SUM(pgsize) FROM dbstat WHERE name IN '
+                    f'(SELECT name FROM sqlite_master WHERE tbl_name IN ({placeholders}))', tables
+                )
+            except Exception:
+                return None
+        else:
+            return None
+        return cursor.fetchone()[0]
+
+
+class Command(BaseCommand):
+    help = 'Compare the normalized visitor table with the old wide one (runs in a rolled-back transaction)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=20000)
+        parser.add_argument('--user-agents', type=int, default=300)
+        parser.add_argument('--pages', type=int, default=30)
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        user_agents = [
+            f'Mozilla/5.0 (Linux; Android 13; SM-A{i}) AppleWebKit/537.36 '
+            f'(KHTML, like Gecko) Chrome/{100 + i % 20}.0 Mobile Safari/537.36'
+            for i in range(options['user_agents'])
+        ]
+        pages = ['/'] + [f'/menu/table-{i}/' for i in range(options['pages'] - 1)]
+        visits = [
+            (rng.choice(user_agents), rng.choice(pages), rng.choice(['', 'https://www.google.com/']))
+            for _ in range(options['rows'])
+        ]
+
+        # SQLite can't change the schema inside the transaction
+        with connection.schema_editor() as editor:
+            editor.create_model(LegacyVisitorLog)
+        try:
+            self.compare(visits)
+        finally:
+            with connection.schema_editor() as editor:
+                editor.delete_model(LegacyVisitorLog)
+            # The rolled-back dimension rows must not stay cached
+            user_agent_ids.clear()
+            page_ids.clear()
+
+    def compare(self, visits):
+        with transaction.atomic():
+            before = table_bytes(VisitorLog._meta.db_table, UserAgent._meta.db_table, Page._meta.db_table)
+
+            # Both layouts get the same visits in batches of the buffer's default size
+            start = time.perf_counter()
+            for i in range(0, len(visits), 200):
+                LegacyVisitorLog.objects.bulk_create([
+                    LegacyVisitorLog(
+                        user_agent=ua, page_visited=page, referrer=referrer,
+                        browser='Chrome', os='Android', device='Samsung',
+                    )
+                    for ua, page, referrer in visits[i:i + 200]
+                ])
+            legacy_elapsed = time.perf_counter() - start
+
+            user_agent_ids.clear()
+            page_ids.clear()
+            start = time.perf_counter()
+            for i in range(0, len(visits), 200):
+                batch = [
+                    VisitorLog(user_agent=ua, page_visited=page, referrer=referrer)
+                    for ua, page, referrer in visits[i:i + 200]
+                ]
+                # What the visitor log buffer does per batch
+                for row in batch:
+                    row.resolve_dimensions()
+                VisitorLog.objects.bulk_create(batch)
+            elapsed = time.perf_counter() - start
+
+            legacy_bytes = table_bytes(LegacyVisitorLog._meta.db_table)
+            after = table_bytes(VisitorLog._meta.db_table, UserAgent._meta.db_table, Page._meta.db_table)
+            rows = len(visits)
+            self.stdout.write(
+                f'wide:       {rows / legacy_elapsed:.0f} rows/s, {self.size(legacy_bytes, rows)}'
+            )
+            self.stdout.write(
+                f'normalized: {rows / elapsed:.0f} rows/s (first sight of each user agent parses it), '
+                f'{self.size(after - before if after is not None else None, rows)}'
+            )
+            transaction.set_rollback(True)
+
+    def size(self, total, rows):
+        if total is None:
+            return 'size n/a on this database'
+        return f'{total / 1024:.0f} KiB ({total / rows:.0f} bytes/row incl. indexes)'
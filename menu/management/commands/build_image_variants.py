@@ -0,0 +1,39 @@
+import requests
+from io import BytesIO
+from django.core.management.base import BaseCommand
+from menu.models import MenuItem
+from menu.images import build_image_variants
+from api.menu_cache import bump_menu_version
+
+
+class Command(BaseCommand):
+    help = 'Generate responsive image variants for menu items uploaded before they existed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Rebuild variants that already exist')
+
+    def handle(self, *args, **options):
+        items = MenuItem.all.exclude(image__isnull=True).exclude(image='')
+        if not options['force']:
+            items = items.filter(image_variants={})
+
+        updated = 0
+        for item in items:
+            try:
+                response = requests.get(item.image.url, timeout=30)
+                response.raise_for_status()
+                variants = build_image_variants(
+                    BytesIO(response.content),
+                    public_id=item.image.public_id,
+                    original_url=item.image.url,
+                )
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"Skipping '{item.name}': {str(e)}"))
+                continue
+            # update() skips the save signals, so the menu version is bumped once below
+            MenuItem.all.filter(pk=item.pk).update(image_variants=variants)
+            updated += 1
+
+        if updated:
+            bump_menu_version()
+        self.stdout.write(self.style.SUCCESS(f'Generated image variants for {updated} menu items'))
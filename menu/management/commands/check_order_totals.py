@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F, Max
+from django.utils import timezone
+from menu.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Verify that every Order.total_price matches the sum of its lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='Rewrite mismatched totals from their lines')
+        parser.add_argument('--chunk-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        last_id = Order.all.aggregate(last_id=Max('id'))['last_id'] or 0
+        checked = mismatched = 0
+
+        # One aggregate query per id range rather than loading any lines
+        for start in range(0, last_id, chunk_size):
+            orders = Order.all.filter(id__gt=start, id__lte=start + chunk_size)
+            checked += orders.count()
+            bad = list(
+                orders.annotate(items_total=Order.items_total())
+                .exclude(total_price=F('items_total'))
+                .values_list('id', 'total_price', 'items_total')
+            )
+            if not bad:
+                continue
+
+            mismatched += len(bad)
+            for order_id, stored, computed in bad:
+                self.stdout.write(f'Order #{order_id}: total {stored}, lines sum to {computed}')
+            if options['fix']:
+                Order.all.filter(id__in=[order_id for order_id, _, _ in bad]).update(
+                    total_price=Order.items_total(), updated_at=timezone.now()
+                )
+
+        summary = f'Checked {checked} orders, {mismatched} mismatched'
+        if mismatched and not options['fix']:
+            # Non-zero exit so a scheduled check gets noticed
+            raise CommandError(summary)
+        self.stdout.write(self.style.SUCCESS(summary + (', fixed' if mismatched else '')))
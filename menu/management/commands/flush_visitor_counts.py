@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from menu.visitors import flush_visitor_counts
+
+
+class Command(BaseCommand):
+    help = 'Move the cached hourly visitor counters into HourlyVisitorCount'
+
+    def handle(self, *args, **options):
+        visits = flush_visitor_counts()
+        if visits is None:
+            self.stdout.write('Another flush is running')
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Flushed {visits} visits'))
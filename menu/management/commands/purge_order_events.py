@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from menu.events import purge_order_events
+
+
+class Command(BaseCommand):
+    help = 'Delete order events older than ORDER_EVENTS_RETENTION (run periodically)'
+
+    def handle(self, *args, **options):
+        deleted = purge_order_events()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} old order events'))
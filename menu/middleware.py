@@ -1,11 +1,26 @@
 import re
 import time
 from django.utils import timezone
-from .models import VisitorLog, QRCode
+from .models import VisitorLog
+from .visitors import record_visit
 from django.utils.deprecation import MiddlewareMixin
-from rest_framework.authtoken.models import Token
+from django.utils.functional import SimpleLazyObject
+from api.authentication import resolve_token
 from django.http import QueryDict
 from menu.utils import get_client_ip
+from menu.cache import resolve_qr_table, user_agent_cache
+
+
+class UserAgentMiddleware(MiddlewareMixin):
+    """
+    Sets a lazy ``request.user_agent`` (a ``UserAgentInfo``), parsed through
+    the same memoized parser VisitorLog uses.
+    """
+    def process_request(self, request):
+        request.user_agent = SimpleLazyObject(
+            lambda: user_agent_cache.parse(request.META.get('HTTP_USER_AGENT', ''))
+        )
+        return None
 
 class VisitorTrackingMiddleware(MiddlewareMixin):
     def process_request(self, request):
@@ -28,10 +43,9 @@ class VisitorTrackingMiddleware(MiddlewareMixin):
         
 
         visitor_type = 'anonymous'
-        user = None
         session_id = None
         table_number = None
-        qr_code = None
+        qr_code_id = None
 
 
         token_key = None
@@ -42,13 +56,10 @@ class VisitorTrackingMiddleware(MiddlewareMixin):
             token_key = request.COOKIES.get('manager_token')
 
         if token_key:
-            try:
-                token = Token.objects.get(key=token_key)
+            owner = resolve_token(token_key)
+            if owner is not None:
                 visitor_type = 'manager'
-                user = token.user
-                session_id = f"manager_{user.id}_{token_key[:8]}"
-            except Token.DoesNotExist:
-                pass
+                session_id = f"manager_{owner.user_id}_{token_key[:8]}"
 
 
         if request.path.startswith('/manager/') and visitor_type == 'manager':
@@ -64,21 +75,19 @@ class VisitorTrackingMiddleware(MiddlewareMixin):
                 query_dict = QueryDict('')
 
             table_uuid = query_dict.get('table_uuid')
-            if table_uuid:
-                try:
-                    qr_code = QRCode.objects.get(uuid=table_uuid)
-                    visitor_type = 'customer'
-                    table_number = qr_code.table_number
-
-                    if hasattr(request, 'session') and not request.session.session_key:
-                        request.session.save()
-                        session_id = request.session.session_key
-                    elif hasattr(request, 'session'):
-                        session_id = request.session.session_key
-                    else:
-                        session_id = f"customer_{table_uuid[:8]}"
-                except (QRCode.DoesNotExist, ValueError):
-                    pass  # Invalid or missing QR code
+            qr_table = resolve_qr_table(table_uuid) if table_uuid else None
+            if qr_table is not None:
+                qr_code_id = qr_table.id
+                visitor_type = 'customer'
+                table_number = qr_table.table_number
+
+                if hasattr(request, 'session') and not request.session.session_key:
+                    request.session.save()
+                    session_id = request.session.session_key
+                elif hasattr(request, 'session'):
+                    session_id = request.session.session_key
+                else:
+                    session_id = f"customer_{table_uuid[:8]}"
 
 
         if request.path.startswith('/manager/'):
@@ -89,22 +98,18 @@ class VisitorTrackingMiddleware(MiddlewareMixin):
             page_visited = request.path
 
 
-        try:
-            VisitorLog.objects.create(
-                visitor_type=visitor_type,
-                session_id=session_id,
-                ip_address=get_client_ip(request),
-                user_agent=request.META.get('HTTP_USER_AGENT', ''),
-                referrer=request.META.get('HTTP_REFERER', ''),
-                page_visited=page_visited,
-                table_number=table_number,
-                qr_code=qr_code,
-                duration=duration
-            )
-        except Exception as e:
-            import logging
-            logger = logging.getLogger(__name__)
-            logger.error(f"Visitor tracking failed: {e}")
+        # Counted, and written in batches by the buffer's flusher if sampled
+        record_visit(VisitorLog(
+            visitor_type=visitor_type,
+            session_id=session_id,
+            ip_address=get_client_ip(request),
+            user_agent=request.META.get('HTTP_USER_AGENT', ''),
+            referrer=request.META.get('HTTP_REFERER', ''),
+            page_visited=page_visited,
+            table_number=table_number,
+            qr_code_id=qr_code_id,
+            duration=duration
+        ))
 
         return response
 
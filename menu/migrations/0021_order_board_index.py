@@ -0,0 +1,43 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:10
+
+from django.db import migrations, models
+
+
+STATUS_PRIORITY = {
+    'new': 1,
+    'in_progress': 2,
+    'pending': 3,
+    'cancelled': 4,
+    'completed': 5,
+    'archived': 6,
+}
+
+
+def fill_status_priority(apps, schema_editor):
+    Order = apps.get_model('menu', 'Order')
+    for status, priority in STATUS_PRIORITY.items():
+        Order.objects.filter(status=status).update(status_priority=priority)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0020_order_updated_at_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='status_priority',
+            field=models.PositiveSmallIntegerField(default=1, editable=False),
+        ),
+        migrations.RunPython(fill_status_priority, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'created_at'], name='menu_order_status_7436bc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status_priority', '-created_at', '-id'], name='menu_order_status__936092_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0021_order_board_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='activitylog',
+            name='activity_type',
+            field=models.CharField(choices=[('menu_view', 'Menu View'), ('category_view', 'Category View'), ('item_view', 'Item View'), ('order_placed', 'Order Placed'), ('order_updated', 'Order Status Changed'), ('qr_generated', 'QR Code Generated'), ('item_created', 'Menu Item Created'), ('item_updated', 'Menu Item Updated'), ('item_deleted', 'Menu Item Deleted'), ('login', 'Manager Login'), ('logout', 'Manager Logout')], max_length=20),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0023_orderevent_order_updated'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='prep_status',
+            field=models.CharField(choices=[('queued', 'Queued'), ('preparing', 'Preparing'), ('ready', 'Ready')], default='queued', max_length=20),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0024_orderitem_prep_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Page',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.CharField(max_length=200, unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UserAgent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=32, unique=True)),
+                ('user_agent', models.TextField()),
+                ('browser', models.CharField(blank=True, max_length=100)),
+                ('os', models.CharField(blank=True, max_length=100)),
+                ('device', models.CharField(blank=True, max_length=100)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='visitorlog',
+            name='page',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='visits', to='menu.page'),
+        ),
+        migrations.AddField(
+            model_name='visitorlog',
+            name='referrer_page',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='referred_visits', to='menu.page'),
+        ),
+        migrations.AddField(
+            model_name='visitorlog',
+            name='agent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='visits', to='menu.useragent'),
+        ),
+    ]
@@ -0,0 +1,66 @@
+from hashlib import md5
+from django.db import migrations, transaction
+
+
+CHUNK_SIZE = 2000
+
+
+def fill_visitor_dimensions(apps, schema_editor):
+    """
+    Point existing visitor rows at deduplicated UserAgent and Page rows.
+    Each chunk commits on its own and converted rows drop out of the
+    candidate set, so an interrupted run picks up where it stopped.
+    """
+    VisitorLog = apps.get_model('menu', 'VisitorLog')
+    UserAgent = apps.get_model('menu', 'UserAgent')
+    Page = apps.get_model('menu', 'Page')
+    agent_ids, page_ids = {}, {}
+
+    while True:
+        with transaction.atomic():
+            rows = list(
+                VisitorLog.objects.filter(page__isnull=True).order_by('pk')
+                .only('id', 'user_agent', 'browser', 'os', 'device', 'referrer', 'page_visited')[:CHUNK_SIZE]
+            )
+            if not rows:
+                return
+
+            agents = {}
+            for row in rows:
+                if row.user_agent and row.user_agent not in agent_ids:
+                    agents[row.user_agent] = UserAgent(
+                        digest=md5(row.user_agent.encode()).hexdigest(), user_agent=row.user_agent,
+                        browser=row.browser, os=row.os, device=row.device,
+                    )
+            if agents:
+                UserAgent.objects.bulk_create(agents.values(), ignore_conflicts=True)
+                ids = dict(UserAgent.objects.filter(
+                    digest__in=[agent.digest for agent in agents.values()]
+                ).values_list('digest', 'id'))
+                for ua_string, agent in agents.items():
+                    agent_ids[ua_string] = ids[agent.digest]
+
+            urls = {row.page_visited[:200] for row in rows} | {row.referrer for row in rows if row.referrer}
+            urls -= page_ids.keys()
+            if urls:
+                Page.objects.bulk_create([Page(url=url) for url in urls], ignore_conflicts=True)
+                page_ids.update(Page.objects.filter(url__in=urls).values_list('url', 'id'))
+
+            for row in rows:
+                row.agent_id = agent_ids.get(row.user_agent)
+                row.page_id = page_ids[row.page_visited[:200]]
+                row.referrer_page_id = page_ids.get(row.referrer)
+            VisitorLog.objects.bulk_update(rows, ['agent', 'page', 'referrer_page'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+    # Commit chunk by chunk instead of holding one transaction over the table
+    atomic = False
+
+    dependencies = [
+        ('menu', '0025_visitor_dimensions'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_visitor_dimensions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0026_fill_visitor_dimensions'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='visitorlog',
+            name='user_agent',
+        ),
+        migrations.RemoveField(
+            model_name='visitorlog',
+            name='browser',
+        ),
+        migrations.RemoveField(
+            model_name='visitorlog',
+            name='os',
+        ),
+        migrations.RemoveField(
+            model_name='visitorlog',
+            name='device',
+        ),
+        migrations.RemoveField(
+            model_name='visitorlog',
+            name='referrer',
+        ),
+        migrations.RemoveField(
+            model_name='visitorlog',
+            name='page_visited',
+        ),
+        migrations.AlterField(
+            model_name='visitorlog',
+            name='page',
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.PROTECT, related_name='visits', to='menu.page'
+            ),
+        ),
+    ]
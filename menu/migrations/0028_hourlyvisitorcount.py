@@ -0,0 +1,51 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:32
+
+from datetime import timezone
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncHour
+
+
+def fill_hourly_visitor_counts(apps, schema_editor):
+    # Start the counters from the visits logged so far, so visitor totals
+    # don't restart from zero when analytics switches to this table
+    VisitorLog = apps.get_model('menu', 'VisitorLog')
+    HourlyVisitorCount = apps.get_model('menu', 'HourlyVisitorCount')
+    hours = VisitorLog.objects.annotate(hour=TruncHour('timestamp', tzinfo=timezone.utc))
+    rows = [
+        HourlyVisitorCount(hour=row['hour'], visitor_type=row['visitor_type'], visits=row['visits'])
+        for row in hours.values('hour', 'visitor_type').annotate(visits=Count('id')).order_by()
+    ]
+    rows += [
+        HourlyVisitorCount(
+            hour=row['hour'], visitor_type='customer', table_number=row['table_number'], visits=row['visits']
+        )
+        for row in hours.filter(visitor_type='customer').exclude(table_number__isnull=True)
+        .exclude(table_number='').values('hour', 'table_number').annotate(visits=Count('id')).order_by()
+    ]
+    HourlyVisitorCount.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0027_visitor_drop_wide_columns'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HourlyVisitorCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('visitor_type', models.CharField(choices=[('anonymous', 'Anonymous Visitor'), ('customer', 'Customer'), ('manager', 'Manager')], max_length=10)),
+                ('table_number', models.CharField(blank=True, default='', max_length=50)),
+                ('visits', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-hour'],
+                'constraints': [models.UniqueConstraint(fields=('hour', 'visitor_type', 'table_number'), name='unique_hourly_visitor_count')],
+            },
+        ),
+        migrations.RunPython(fill_hourly_visitor_counts, migrations.RunPython.noop),
+    ]
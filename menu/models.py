@@ -1,13 +1,16 @@
 import os
 import uuid
+from decimal import Decimal
 import cloudinary.uploader
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.conf import settings
 from cloudinary.models import CloudinaryField
 from django.utils import timezone
 from urllib.parse import urlparse
-from user_agents import parse
 from django.contrib.auth.models import User
+from django.core.files.uploadedfile import UploadedFile
+from .images import build_image_variants, cloudinary_configured
 
 
 
@@ -35,9 +38,12 @@ class MenuItem(models.Model):
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='menu_items')
     is_available = models.BooleanField(default=True)
     is_active = models.BooleanField(default=True)
+    image_variants = models.JSONField(default=dict, blank=True)
     
     @property
     def image_url(self):
+        if self.image_variants.get('original'):
+            return self.image_variants['original']
         if self.image:
             image_url = self.image.url
             # Force HTTPS if the URL is served over HTTP
@@ -50,6 +56,24 @@ class MenuItem(models.Model):
     def __str__(self):
         return self.name
     
+    def save(self, *args, **kwargs):
+        if isinstance(self.image, UploadedFile):
+            self.image_variants = self.generate_image_variants()
+        elif not self.image:
+            self.image_variants = {}
+        super().save(*args, **kwargs)
+
+    def generate_image_variants(self):
+        upload = self.image
+        public_id = original_url = None
+        if cloudinary_configured():
+            # Upload now rather than in the field's pre_save so the variant
+            # URLs can be derived from the public id in the same write
+            self._meta.get_field('image').pre_save(self, self._state.adding)
+            public_id, original_url = self.image.public_id, self.image.url
+        upload.seek(0)
+        return build_image_variants(upload, public_id=public_id, original_url=original_url)
+
     def delete(self, *args, **kwargs):
         # Delete image from Cloudinary when menu item is deleted
         if self.image:
@@ -65,6 +89,28 @@ class MenuItem(models.Model):
     objects = ActiveManager()  # the custom manager
     all = models.Manager()
 
+class MenuChange(models.Model):
+    """
+    Journal of menu writes, keyed by the menu version each one produced, so
+    clients holding an older version can fetch only what changed.
+    """
+    KINDS = [
+        ('item', 'Menu Item'),
+        ('category', 'Category'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KINDS)
+    object_id = models.BigIntegerField()
+    deleted = models.BooleanField(default=False)
+    version = models.BigIntegerField(db_index=True)
+    timestamp = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['version']
+
+    def __str__(self):
+        return f"{self.kind} #{self.object_id} @ {self.version}"
+
 class Order(models.Model):
     STATUS_CHOICES = [
         ('new', 'New'),
@@ -74,33 +120,139 @@ class Order(models.Model):
         ('cancelled', 'Cancelled'),
         ('archived', 'Archived'),
     ]
+    # Order board ranking, stored so listing can walk an index
+    STATUS_PRIORITY = {
+        'new': 1,
+        'in_progress': 2,
+        'pending': 3,
+        'cancelled': 4,
+        'completed': 5,
+        'archived': 6,
+    }
+    # Orders whose lines can still be edited
+    EDITABLE_STATUSES = ('new', 'pending', 'in_progress')
+    # Status changes the order board allows
+    STATUS_TRANSITIONS = {
+        'new': {'in_progress', 'cancelled'},
+        'pending': {'in_progress', 'cancelled'},
+        'in_progress': {'completed', 'cancelled'},
+        'completed': {'archived'},
+        'cancelled': {'archived'},
+        'archived': set(),
+    }
 
     table_number = models.CharField(max_length=50)
     status = models.CharField(max_length=50, choices=STATUS_CHOICES, default='new')
+    status_priority = models.PositiveSmallIntegerField(default=1, editable=False)
     total_price = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+            models.Index(fields=['status_priority', '-created_at', '-id']),
+        ]
 
     def __str__(self):
         return f"Order #{self.id} - Table {self.table_number}"
 
+    def save(self, *args, **kwargs):
+        self.status_priority = self.STATUS_PRIORITY.get(self.status, 6)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'status' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'status_priority'}
+        super().save(*args, **kwargs)
+
     def update_total(self):
-        self.total_price = sum(item.price_at_order * item.quantity for item in self.items.all())
-        self.save()
+        """
+        Recompute total_price from the order lines in a single UPDATE.
+        """
+        Order.all.filter(pk=self.pk).update(total_price=Order.items_total(), updated_at=timezone.now())
+        self.refresh_from_db(fields=['total_price', 'updated_at'])
+
+    @classmethod
+    def add_to_total(cls, order_id, amount):
+        # Atomic increment, so concurrent line edits can't lose each other's change
+        cls.all.filter(pk=order_id).update(
+            total_price=models.F('total_price') + amount, updated_at=timezone.now()
+        )
+
+    @staticmethod
+    def items_total():
+        """
+        SQL expression for the sum of an order's lines, for annotate() or update().
+        """
+        lines = OrderItem.objects.filter(order=models.OuterRef('pk')).values('order')\
+            .annotate(total=models.Sum(models.F('price_at_order') * models.F('quantity')))\
+            .values('total')
+        return Coalesce(
+            models.Subquery(lines), models.Value(Decimal('0')),
+            output_field=models.DecimalField(max_digits=10, decimal_places=2)
+        )
 
     objects = ActiveManager()  # the custom manager
     all = models.Manager()
     
 class OrderItem(models.Model):
+    # Kitchen progress of a line; bumping moves it one step along
+    PREP_STATUSES = [
+        ('queued', 'Queued'),
+        ('preparing', 'Preparing'),
+        ('ready', 'Ready'),
+    ]
+    NEXT_PREP_STATUS = {'queued': 'preparing', 'preparing': 'ready'}
+
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
     menu_item = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
     quantity = models.IntegerField(default=1)
     price_at_order = models.DecimalField(max_digits=10, decimal_places=2)
+    prep_status = models.CharField(max_length=20, choices=PREP_STATUSES, default='queued')
 
     def __str__(self):
         return f"{self.quantity}x {self.menu_item.name} for Order #{self.order.id}"
 
+class OrderEvent(models.Model):
+    """
+    Order created / status changed events for the live dashboard.
+    The table doubles as the pub/sub bus between workers: each worker tails
+    it by id and fans new rows out to its own waiting long-polls.
+    """
+    EVENT_TYPES = [
+        ('order_created', 'Order Created'),
+        ('order_status_changed', 'Order Status Changed'),
+        ('order_updated', 'Order Updated'),
+    ]
+
+    event_type = models.CharField(max_length=30, choices=EVENT_TYPES)
+    order_id = models.BigIntegerField()
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.event_type} #{self.order_id}"
+
+class IdempotencyKey(models.Model):
+    """
+    Response recorded for a client-supplied Idempotency-Key, so retried
+    requests are answered without running again. A row without a
+    response_status belongs to a request that is still in flight, unless
+    it was claimed so long ago that its worker must have died.
+    """
+    key = models.CharField(max_length=255, unique=True)
+    request_hash = models.CharField(max_length=64)
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    claimed_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return self.key
+
 class QRCode(models.Model):
     uuid = models.CharField(max_length=8, unique=True, default='', editable=False)
     table_number = models.CharField(max_length=50, unique=True)
@@ -123,6 +275,30 @@ class QRCode(models.Model):
     def __str__(self):
         return f"{self.table_number}"
 
+class UserAgent(models.Model):
+    """
+    A distinct user agent string seen by visitor tracking, parsed once.
+    Rows are only ever added, so their ids can be cached by string.
+    """
+    # md5 of the string; user agents are too long to index directly
+    digest = models.CharField(max_length=32, unique=True)
+    user_agent = models.TextField()
+    browser = models.CharField(max_length=100, blank=True)
+    os = models.CharField(max_length=100, blank=True)
+    device = models.CharField(max_length=100, blank=True)
+
+    def __str__(self):
+        return self.user_agent
+
+class Page(models.Model):
+    """
+    A distinct visited page or referrer URL, shared by visitor rows.
+    """
+    url = models.CharField(max_length=200, unique=True)
+
+    def __str__(self):
+        return self.url
+
 class VisitorLog(models.Model):
     VISITOR_TYPES = [
         ('anonymous', 'Anonymous Visitor'),
@@ -134,34 +310,89 @@ class VisitorLog(models.Model):
     visitor_type = models.CharField(max_length=10, choices=VISITOR_TYPES, default='anonymous')
     session_id = models.CharField(max_length=100, blank=True, null=True)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
-    user_agent = models.TextField(blank=True)
-    browser = models.CharField(max_length=100, blank=True)
-    os = models.CharField(max_length=100, blank=True)
-    device = models.CharField(max_length=100, blank=True)
-    referrer = models.URLField(blank=True)
-    page_visited = models.CharField(max_length=200)
     table_number = models.CharField(max_length=50, blank=True, null=True)
     qr_code = models.ForeignKey('QRCode', on_delete=models.SET_NULL, null=True, blank=True)
     timestamp = models.DateTimeField(default=timezone.now)
     duration = models.FloatField(help_text="Duration in seconds", null=True, blank=True)
+    agent = models.ForeignKey(UserAgent, on_delete=models.PROTECT, null=True, blank=True, related_name='visits')
+    page = models.ForeignKey(Page, on_delete=models.PROTECT, related_name='visits')
+    referrer_page = models.ForeignKey(
+        Page, on_delete=models.PROTECT, null=True, blank=True, related_name='referred_visits'
+    )
     
     class Meta:
         ordering = ['-timestamp']
     
+    # user_agent, page_visited and referrer used to be columns. They can
+    # still be passed to the constructor or assigned; resolve_dimensions()
+    # turns the strings into dimension rows before the row is written.
+    def _pending_dimensions(self):
+        return self.__dict__.setdefault('_dimensions', {})
+
+    @property
+    def user_agent(self):
+        pending = self._pending_dimensions()
+        if 'user_agent' in pending:
+            return pending['user_agent']
+        return self.agent.user_agent if self.agent_id else ''
+
+    @user_agent.setter
+    def user_agent(self, value):
+        self._pending_dimensions()['user_agent'] = value or ''
+
+    @property
+    def page_visited(self):
+        pending = self._pending_dimensions()
+        if 'page_visited' in pending:
+            return pending['page_visited']
+        return self.page.url if self.page_id else ''
+
+    @page_visited.setter
+    def page_visited(self, value):
+        self._pending_dimensions()['page_visited'] = value or ''
+
+    @property
+    def referrer(self):
+        pending = self._pending_dimensions()
+        if 'referrer' in pending:
+            return pending['referrer']
+        return self.referrer_page.url if self.referrer_page_id else ''
+
+    @referrer.setter
+    def referrer(self, value):
+        self._pending_dimensions()['referrer'] = value or ''
+
+    @property
+    def browser(self):
+        return self.agent.browser if self.agent_id else ''
+
+    @property
+    def os(self):
+        return self.agent.os if self.agent_id else ''
+
+    @property
+    def device(self):
+        return self.agent.device if self.agent_id else ''
+
     def save(self, *args, **kwargs):
-        # Parse user agent string
-        if self.user_agent:
-            try:
-                ua = parse(self.user_agent)
-                self.browser = f"{ua.browser.family} {ua.browser.version_string}"
-                self.os = f"{ua.os.family} {ua.os.version_string}"
-                self.device = ua.device.family
-            except:
-                # If user agent parsing fails, still save the record
-                self.browser = 'Unknown'
-                self.os = 'Unknown'
-                self.device = 'Unknown'
+        self.resolve_dimensions()
         super().save(*args, **kwargs)
+
+    def resolve_dimensions(self):
+        """
+        Point the row at the UserAgent and Page rows for the strings set on
+        it. Called by save() and by the visitor log buffer, whose
+        bulk_create skips save().
+        """
+        # Imported here because menu.cache imports the models
+        from .cache import resolve_page, resolve_user_agent
+        pending = self.__dict__.pop('_dimensions', {})
+        if 'user_agent' in pending:
+            self.agent_id = resolve_user_agent(pending['user_agent'])
+        if 'page_visited' in pending:
+            self.page_id = resolve_page(pending['page_visited'])
+        if 'referrer' in pending:
+            self.referrer_page_id = resolve_page(pending['referrer']) if pending['referrer'] else None
     
     def __str__(self):
         return f"{self.visitor_type} - {self.page_visited} - {self.timestamp}"
@@ -172,6 +403,7 @@ class ActivityLog(models.Model):
         ('category_view', 'Category View'),
         ('item_view', 'Item View'),
         ('order_placed', 'Order Placed'),
+        ('order_updated', 'Order Status Changed'),
         ('qr_generated', 'QR Code Generated'),
         ('item_created', 'Menu Item Created'),
         ('item_updated', 'Menu Item Updated'),
@@ -203,4 +435,26 @@ class DailyRevenue(models.Model):
         ordering = ['-date']
     
     def __str__(self):
-        return f"{self.date} - ETB{self.total_revenue}"
\ No newline at end of file
+        return f"{self.date} - ETB{self.total_revenue}"
+
+class HourlyVisitorCount(models.Model):
+    """
+    Exact visit counts per hour and visitor type, flushed from the cache
+    counters kept by visitor tracking. ``table_number`` is blank on the
+    per-type total; customer rows per table sit alongside it.
+    """
+    hour = models.DateTimeField()
+    visitor_type = models.CharField(max_length=10, choices=VisitorLog.VISITOR_TYPES)
+    table_number = models.CharField(max_length=50, blank=True, default='')
+    visits = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-hour']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['hour', 'visitor_type', 'table_number'], name='unique_hourly_visitor_count'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.hour} - {self.visitor_type} {self.table_number} - {self.visits}"
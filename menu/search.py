@@ -0,0 +1,243 @@
+import re
+import sys
+import threading
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+from .models import MenuItem
+
+
+TOKEN_RE = re.compile(r'\w+')
+
+# How much a match in each field counts towards an item's score
+FIELD_WEIGHTS = {
+    'name': 3.0,
+    'category': 2.0,
+    'description': 1.0,
+}
+PREFIX_FACTOR = 0.8
+TYPO_FACTOR = 0.5
+# Shorter tokens match too much of the vocabulary with one edit
+TYPO_MIN_LENGTH = 4
+
+
+def fold(text):
+    """
+    Lower-case ``text`` and strip accents so "Café" and "cafe" index alike.
+    """
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(fold(text or ''))
+
+
+def deletes(token):
+    return {token[:i] + token[i + 1:] for i in range(len(token))}
+
+
+def within_one_edit(a, b):
+    """
+    True when ``a`` and ``b`` differ by at most one insertion, deletion,
+    substitution or adjacent transposition.
+    """
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    if len(a) == len(b):
+        return a[i + 1:] == b[i + 1:] or (
+            a[i:i + 2] == b[i:i + 2][::-1] and a[i + 2:] == b[i + 2:]
+        )
+    return a[i:] == b[i + 1:]
+
+
+def _deep_size(obj, seen=None):
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_size(k, seen) + _deep_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(_deep_size(item, seen) for item in obj)
+    return size
+
+
+class MenuSearchIndex:
+    """
+    Per-process inverted index over available menu items.
+
+    Maps folded tokens to ``{item_id: weight}`` postings, keeps the sorted
+    vocabulary for prefix lookups and a single-deletion table for typo
+    tolerance. ``version`` records the menu version the index reflects so
+    changes made by other workers trigger a rebuild.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+        self.version = None
+
+    def _reset(self):
+        self.postings = defaultdict(dict)
+        self.documents = {}
+        self.deletions = defaultdict(set)
+        self.vocabulary = []
+        self._vocabulary_dirty = False
+        self._memory_bytes = None
+
+    def rebuild(self, version=None):
+        items = MenuItem.objects.filter(is_available=True).select_related('category')
+        with self._lock:
+            self._reset()
+            for item in items:
+                self._add(item.id, self._item_fields(item))
+            self.version = version
+
+    def update_item(self, item, version=None):
+        """
+        Re-index one item after it was saved or deleted. Does nothing until
+        the index has been built; the first search builds it from scratch.
+        """
+        with self._lock:
+            if self.version is None:
+                return
+            self._remove(item.id)
+            if item.is_active and item.is_available:
+                self._add(item.id, self._item_fields(item))
+            self.version = version
+
+    def remove_item(self, item_id, version=None):
+        with self._lock:
+            if self.version is None:
+                return
+            self._remove(item_id)
+            self.version = version
+
+    def invalidate(self):
+        with self._lock:
+            self.version = None
+
+    def ensure_current(self, version):
+        if self.version != version:
+            self.rebuild(version)
+
+    def _item_fields(self, item):
+        return {
+            'name': item.name,
+            'category': item.category.name,
+            'description': item.description,
+        }
+
+    def _add(self, item_id, fields):
+        weights = {}
+        for field, text in fields.items():
+            for token in tokenize(text):
+                weights[token] = max(weights.get(token, 0), FIELD_WEIGHTS[field])
+
+        for token, weight in weights.items():
+            if token not in self.postings:
+                self._vocabulary_dirty = True
+                for key in deletes(token):
+                    self.deletions[key].add(token)
+            self.postings[token][item_id] = weight
+        self.documents[item_id] = tuple(weights)
+        self._memory_bytes = None
+
+    def _remove(self, item_id):
+        for token in self.documents.pop(item_id, ()):
+            postings = self.postings[token]
+            postings.pop(item_id, None)
+            if not postings:
+                del self.postings[token]
+                self._vocabulary_dirty = True
+                for key in deletes(token):
+                    self.deletions[key].discard(token)
+                    if not self.deletions[key]:
+                        del self.deletions[key]
+        self._memory_bytes = None
+
+    def _sorted_vocabulary(self):
+        if self._vocabulary_dirty or len(self.vocabulary) != len(self.postings):
+            self.vocabulary = sorted(self.postings)
+            self._vocabulary_dirty = False
+        return self.vocabulary
+
+    def _matching_terms(self, token):
+        """
+        Yield ``(term, factor)`` for vocabulary terms matching a query token
+        exactly, by prefix, or within one typo.
+        """
+        if token in self.postings:
+            yield token, 1.0
+
+        vocabulary = self._sorted_vocabulary()
+        i = bisect_left(vocabulary, token)
+        while i < len(vocabulary) and vocabulary[i].startswith(token):
+            if vocabulary[i] != token:
+                yield vocabulary[i], PREFIX_FACTOR
+            i += 1
+
+        if len(token) >= TYPO_MIN_LENGTH:
+            candidates = set(self.deletions.get(token, ()))
+            for key in deletes(token) | {token}:
+                if key in self.postings:
+                    candidates.add(key)
+                candidates.update(self.deletions.get(key, ()))
+            for term in candidates:
+                if term != token and not term.startswith(token) and within_one_edit(term, token):
+                    yield term, TYPO_FACTOR
+
+    def search(self, query, limit=20):
+        """
+        Return item ids matching every token of ``query``, best first.
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        with self._lock:
+            scores = None
+            for token in tokens:
+                token_scores = {}
+                for term, factor in self._matching_terms(token):
+                    for item_id, weight in self.postings[term].items():
+                        score = weight * factor
+                        if score > token_scores.get(item_id, 0):
+                            token_scores[item_id] = score
+                if scores is None:
+                    scores = token_scores
+                else:
+                    scores = {
+                        item_id: score + token_scores[item_id]
+                        for item_id, score in scores.items() if item_id in token_scores
+                    }
+                if not scores:
+                    return []
+
+        ranked = sorted(scores.items(), key=lambda entry: (-entry[1], entry[0]))
+        return [item_id for item_id, _ in ranked[:limit]]
+
+    def stats(self):
+        with self._lock:
+            if self._memory_bytes is None:
+                self._memory_bytes = (
+                    _deep_size(self.postings) + _deep_size(self.documents)
+                    + _deep_size(self.deletions) + _deep_size(self.vocabulary)
+                )
+            return {
+                'items': len(self.documents),
+                'terms': len(self.postings),
+                'memory_bytes': self._memory_bytes,
+            }
+
+
+menu_search_index = MenuSearchIndex()
@@ -1,10 +1,22 @@
-from django.db.models.signals import post_save, post_delete
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth.signals import user_logged_in, user_logged_out
-from .models import ActivityLog, MenuItem, Category, Order, QRCode
+from .models import ActivityLog, MenuItem, MenuChange, Category, Order, QRCode
 from django.contrib.auth.models import User
+from rest_framework.authtoken.models import Token
+from api.authentication import evict_token
 from api.views import manager_logged_in, manager_logged_out
+from api.menu_cache import (
+    bump_qr_version, bump_category_version, bump_kitchen_version, changes_cutoff_version,
+    next_menu_version
+)
 from .utils import get_client_ip
+from .cache import invalidate_qr_table
+from .search import menu_search_index
+from .archiving import roll_up_revenue
+from .events import order_changed, publish_order_event
+from .kitchen import kitchen_queue
 
 @receiver(post_save, sender=MenuItem)
 def log_menu_item_activity(sender, instance, created, **kwargs):
@@ -31,6 +43,70 @@ def log_menu_item_delete(sender, instance, **kwargs):
         }
     )
 
+def record_menu_change(kind, object_id, version, deleted=False):
+    MenuChange.objects.create(kind=kind, object_id=object_id, version=version, deleted=deleted)
+    MenuChange.objects.filter(version__lt=changes_cutoff_version()).delete()
+
+@receiver(pre_save, sender=MenuItem)
+def remember_menu_item_category(sender, instance, **kwargs):
+    # An item moved to another category must also drop out of the old shard
+    instance._previous_category_id = MenuItem.all.filter(pk=instance.pk)\
+        .values_list('category_id', flat=True).first() if instance.pk else None
+
+@receiver(post_save, sender=MenuItem)
+@receiver(post_delete, sender=MenuItem)
+def invalidate_menu_item_shards(sender, instance, signal, **kwargs):
+    previous_category_id = getattr(instance, '_previous_category_id', None)
+    # delete() clears the pk once the signals have run
+    item_id, category_id = instance.id, instance.category_id
+    deleted = signal is post_delete
+
+    def invalidate():
+        if previous_category_id and previous_category_id != category_id:
+            bump_category_version(previous_category_id)
+        bump_category_version(category_id)
+        # Journal before publishing: a delta request that saw the new version
+        # first would cache the delta up to it without this change
+        with next_menu_version() as version:
+            record_menu_change('item', item_id, version, deleted=deleted)
+
+        if deleted:
+            menu_search_index.remove_item(item_id, version)
+        else:
+            menu_search_index.update_item(instance, version)
+
+    # Bumping before commit would let a concurrent read cache the old rows
+    # under the new version
+    transaction.on_commit(invalidate)
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_shard(sender, instance, signal, **kwargs):
+    category_id = instance.id
+    deleted = signal is post_delete
+
+    def invalidate():
+        bump_category_version(category_id)
+        with next_menu_version() as version:
+            record_menu_change('category', category_id, version, deleted=deleted)
+        # Category names are indexed on every item, so rebuild on next search
+        menu_search_index.invalidate()
+        # Categories are the kitchen stations
+        bump_kitchen_version()
+
+    transaction.on_commit(invalidate)
+
+@receiver(post_save, sender=QRCode)
+@receiver(post_delete, sender=QRCode)
+def invalidate_qr_version(sender, instance, **kwargs):
+    uuid = instance.uuid
+
+    def invalidate():
+        invalidate_qr_table(uuid)
+        bump_qr_version()
+
+    transaction.on_commit(invalidate)
+
 @receiver(post_save, sender=Order)
 def log_order_activity(sender, instance, created, **kwargs):
     if created:
@@ -44,6 +120,41 @@ def log_order_activity(sender, instance, created, **kwargs):
             }
         )
 
+@receiver(pre_save, sender=Order)
+def remember_order_status(sender, instance, **kwargs):
+    instance._previous_status = Order.all.filter(pk=instance.pk)\
+        .values_list('status', flat=True).first() if instance.pk else None
+
+@receiver(post_save, sender=Order)
+def publish_order_change(sender, instance, created, **kwargs):
+    if created:
+        publish_order_event(instance.id, 'order_created')
+    elif instance.status != getattr(instance, '_previous_status', instance.status):
+        publish_order_event(instance.id, 'order_status_changed')
+
+@receiver(post_save, sender=Order)
+def roll_up_archived_order(sender, instance, created, **kwargs):
+    # Archived orders leave the live revenue figures; bulk archiving rolls
+    # up its own orders
+    if not created and instance.status == 'archived':
+        previous_status = getattr(instance, '_previous_status', instance.status)
+        if previous_status != 'archived':
+            roll_up_revenue([{
+                'status': previous_status,
+                'total_price': instance.total_price,
+                'created_at': instance.created_at,
+            }])
+
+@receiver(order_changed)
+def update_kitchen_queue(sender, orders, **kwargs):
+    kitchen_queue.update_orders(orders, bump_kitchen_version())
+
+@receiver(post_delete, sender=Order)
+def drop_deleted_order_from_kitchen(sender, instance, **kwargs):
+    # Deleted orders publish no events; other workers rebuild on the new version
+    order_id = instance.id
+    transaction.on_commit(lambda: kitchen_queue.remove_order(order_id, bump_kitchen_version()))
+
 @receiver(post_save, sender=QRCode)
 def log_qr_activity(sender, instance, created, **kwargs):
     if created:
@@ -93,3 +204,20 @@ def log_manager_logout(sender, request, user, **kwargs):
             details={'ip_address': get_client_ip(request), 'auth_type': 'token'}
         )
 
+@receiver(post_delete, sender=Token)
+def evict_deleted_token(sender, instance, **kwargs):
+    # Logout deletes the token; it must stop working at once, not after the
+    # TTL. Evicting before commit would let a concurrent request cache it again.
+    key = instance.key
+    transaction.on_commit(lambda: evict_token(key))
+
+@receiver(post_save, sender=User)
+def evict_user_tokens(sender, instance, **kwargs):
+    # Cached token owners carry is_active and the username
+    keys = list(Token.objects.filter(user=instance).values_list('key', flat=True))
+
+    def evict():
+        for key in keys:
+            evict_token(key)
+
+    transaction.on_commit(evict)
@@ -1,6 +1,18 @@
+from rest_framework.settings import api_settings
 
 
 def get_client_ip(request):
+    """
+    The client's address. Clients can put anything in X-Forwarded-For, so
+    only the entries appended by the ``NUM_PROXIES`` trusted proxies in
+    front of the app count (the REST_FRAMEWORK setting DRF uses for the
+    same purpose): the address the outermost of them saw. Without proxies
+    the header is ignored.
+    """
+    remote_addr = request.META.get('REMOTE_ADDR')
     x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-    return x_forwarded_for.split(',')[0] if x_forwarded_for else request.META.get('REMOTE_ADDR')
-
+    num_proxies = api_settings.NUM_PROXIES or 0
+    if not num_proxies or not x_forwarded_for:
+        return remote_addr
+    addresses = x_forwarded_for.split(',')
+    return addresses[-min(num_proxies, len(addresses))].strip()
@@ -1,7 +1,20 @@
 from django.shortcuts import render
+from menu.models import QRCode
+from api.menu_cache import get_menu_data, get_table_menu_data, use_lazy_menu
 
 def index_view(request):
-    return render(request, 'menu/index.html')
+    # Embed the cached menu so the page can render without a first API call,
+    # unless the browser holds an offline copy it will bring up to date itself
+    initial_menu = None
+    if not request.COOKIES.get('menu_version', '').isdigit():
+        table_uuid = request.GET.get('table_uuid')
+        # The page's script handles both shapes; ?lazy=1 embeds the index
+        lazy = use_lazy_menu(request)
+        try:
+            initial_menu = get_table_menu_data(table_uuid, lazy) if table_uuid else get_menu_data(lazy)
+        except QRCode.DoesNotExist:
+            pass
+    return render(request, 'menu/index.html', {'initial_menu': initial_menu})
 
 def manager_view(request):
     return render(request, 'menu/manager.html')
\ No newline at end of file
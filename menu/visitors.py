@@ -0,0 +1,289 @@
+import logging
+import random
+import threading
+import time
+from datetime import timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, connection, transaction, DatabaseError
+from django.db.models import F
+from django.utils import timezone
+from .models import HourlyVisitorCount, QRCode, VisitorLog
+
+logger = logging.getLogger(__name__)
+
+
+# Buffered rows are written in batches of up to VISITOR_LOG_BATCH_SIZE, as
+# soon as a batch is full or VISITOR_LOG_FLUSH_MILLISECONDS after the last
+# write. Past VISITOR_LOG_BUFFER_SIZE waiting rows (the database is slow or
+# down) new rows are dropped instead of holding up requests.
+VISITOR_LOG_BATCH_SIZE = getattr(settings, 'VISITOR_LOG_BATCH_SIZE', 200)
+VISITOR_LOG_FLUSH_MILLISECONDS = getattr(settings, 'VISITOR_LOG_FLUSH_MILLISECONDS', 1000)
+VISITOR_LOG_BUFFER_SIZE = getattr(settings, 'VISITOR_LOG_BUFFER_SIZE', 10000)
+
+# Hourly visit counters live in the shared cache until flushed into
+# HourlyVisitorCount, every VISITOR_COUNTS_FLUSH_SECONDS by whichever worker
+# is tracking visits and by the flush_visitor_counts command. A flush reads
+# every hour since the previous one, so counters are only lost if nothing
+# flushes them for VISITOR_COUNT_TTL.
+VISITOR_COUNT_KEY = 'visitors:count:{hour:%Y%m%d%H}:{visitor_type}:{qr_code_id}'
+VISITOR_COUNTS_FLUSHED_KEY = 'visitors:count:flushed-hour'
+VISITOR_COUNTS_FLUSH_LOCK_KEY = 'visitors:count:flush-lock'
+VISITOR_COUNTS_FLUSH_LOCK_SECONDS = 60
+VISITOR_COUNT_TTL = 2 * 24 * 60 * 60
+
+
+class VisitorLogBuffer:
+    """
+    Per-process write-behind buffer for ``VisitorLog`` rows.
+
+    Requests only append an unsaved row; a flusher thread bulk-creates
+    them in batches, so tracking costs no database round trip on the
+    response path. Gunicorn's ``worker_exit`` hook (gunicorn.conf.py)
+    writes whatever is still buffered when a worker stops. With
+    ``VISITOR_LOG_SYNC`` on, rows are written straight away in the calling
+    thread instead (for tests).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rows = []
+        self._wake = threading.Event()
+        self._thread = None
+        self.written = 0
+        self.dropped = 0
+
+    def add(self, row):
+        # Read at call time so override_settings applies
+        if getattr(settings, 'VISITOR_LOG_SYNC', False):
+            self._write([row])
+            return
+
+        with self._lock:
+            if len(self._rows) >= VISITOR_LOG_BUFFER_SIZE:
+                self.dropped += 1
+                return
+            self._rows.append(row)
+            batch_ready = len(self._rows) >= VISITOR_LOG_BATCH_SIZE
+            # Threads don't survive a fork, so a preloaded worker starts its own
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name='visitor-log-flusher', daemon=True
+                )
+                self._thread.start()
+        if batch_ready:
+            self._wake.set()
+
+    def flush(self):
+        """
+        Write everything buffered so far, in the calling thread.
+        """
+        while True:
+            with self._lock:
+                batch = self._rows[:VISITOR_LOG_BATCH_SIZE]
+                del self._rows[:VISITOR_LOG_BATCH_SIZE]
+            if not batch:
+                return
+            self._write(batch)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'buffered': len(self._rows),
+                'written': self.written,
+                'dropped': self.dropped,
+            }
+
+    def _write(self, rows):
+        try:
+            # bulk_create skips save(), which is where dimensions are resolved
+            for row in rows:
+                row.resolve_dimensions()
+            VisitorLog.objects.bulk_create(rows)
+        except DatabaseError:
+            logger.exception('Visitor tracking failed, dropped %d rows', len(rows))
+            with self._lock:
+                self.dropped += len(rows)
+        else:
+            with self._lock:
+                self.written += len(rows)
+
+    def _run(self):
+        try:
+            while True:
+                self._wake.wait(VISITOR_LOG_FLUSH_MILLISECONDS / 1000)
+                self._wake.clear()
+                # _write only expects database errors; anything else must not
+                # end the thread and leave the buffer filling up unwritten
+                try:
+                    close_old_connections()
+                    self.flush()
+                except Exception:
+                    logger.exception('Visitor log flush failed')
+        finally:
+            connection.close()
+
+
+visitor_log_buffer = VisitorLogBuffer()
+
+
+class VisitorCountFlusher:
+    """
+    Per-process trigger for ``flush_visitor_counts``.
+
+    Every tracked visit calls ``maybe_flush``; once
+    ``VISITOR_COUNTS_FLUSH_SECONDS`` have passed since the last flush it
+    starts a short-lived thread to run the next one, whatever the sample
+    rate or ``VISITOR_LOG_SYNC`` say. A setting of 0 leaves flushing to the
+    management command.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._due_at = None
+        self._thread = None
+
+    def maybe_flush(self):
+        # Read at call time so override_settings applies
+        interval = getattr(settings, 'VISITOR_COUNTS_FLUSH_SECONDS', 60)
+        if not interval:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if self._due_at is None:
+                self._due_at = now + interval
+            if now < self._due_at or (self._thread is not None and self._thread.is_alive()):
+                return
+            self._due_at = now + interval
+            self._thread = threading.Thread(target=self._run, name='visitor-count-flusher', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        try:
+            flush_visitor_counts()
+        except Exception:
+            # Counters stay in the cache for the next flush
+            logger.exception('Flushing visitor counts failed')
+        finally:
+            connection.close()
+
+
+visitor_count_flusher = VisitorCountFlusher()
+
+
+def hour_start(when):
+    return when.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def _count_key(hour, visitor_type, qr_code_id=None):
+    return VISITOR_COUNT_KEY.format(hour=hour, visitor_type=visitor_type, qr_code_id=qr_code_id or '')
+
+
+def _increment(key):
+    cache.add(key, 0, VISITOR_COUNT_TTL)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Evicted between add() and incr()
+        cache.set(key, 1, VISITOR_COUNT_TTL)
+
+
+def record_visit(row):
+    """
+    Count a tracked visit and log it through the buffer if it is sampled.
+    The hourly counters see every visit; ``VISITOR_SAMPLE_RATES`` only
+    thins out the ``VisitorLog`` rows.
+    """
+    hour = hour_start(row.timestamp)
+    _increment(_count_key(hour, row.visitor_type))
+    if row.visitor_type == 'customer' and row.qr_code_id:
+        _increment(_count_key(hour, row.visitor_type, row.qr_code_id))
+
+    visitor_count_flusher.maybe_flush()
+
+    # Read at call time so override_settings applies
+    rate = getattr(settings, 'VISITOR_SAMPLE_RATES', {}).get(row.visitor_type, 1.0)
+    if rate >= 1 or random.random() < rate:
+        visitor_log_buffer.add(row)
+
+
+def add_hourly_visits(hour, visitor_type, table_number, visits):
+    HourlyVisitorCount.objects.get_or_create(hour=hour, visitor_type=visitor_type, table_number=table_number)
+    HourlyVisitorCount.objects.filter(
+        hour=hour, visitor_type=visitor_type, table_number=table_number
+    ).update(visits=F('visits') + visits)
+
+
+def _pending_hours(now):
+    """
+    Hours whose counters may still hold visits: back to the hour before the
+    last flush (a visit counted just as the hour turned can land after it),
+    or as far as counters live when no flush is on record.
+    """
+    current = hour_start(now)
+    oldest = current - timedelta(seconds=VISITOR_COUNT_TTL)
+    flushed = cache.get(VISITOR_COUNTS_FLUSHED_KEY)
+    if flushed is not None:
+        oldest = max(oldest, flushed - timedelta(hours=1))
+    hours = []
+    hour = current
+    while hour >= oldest:
+        hours.append(hour)
+        hour -= timedelta(hours=1)
+    return hours
+
+
+def _counter_keys(now):
+    """
+    ``{cache key: (hour, visitor_type, table_number)}`` for every counter
+    that may still hold visits.
+    """
+    tables = dict(QRCode.objects.values_list('id', 'table_number'))
+    keys = {}
+    for hour in _pending_hours(now):
+        for visitor_type, _ in VisitorLog.VISITOR_TYPES:
+            keys[_count_key(hour, visitor_type)] = (hour, visitor_type, '')
+        for qr_code_id, table_number in tables.items():
+            keys[_count_key(hour, 'customer', qr_code_id)] = (hour, 'customer', table_number)
+    return keys
+
+
+def flush_visitor_counts(now=None):
+    """
+    Add the cached hourly counters to ``HourlyVisitorCount`` and take what
+    was added off the counters, so visits counted meanwhile stay for the
+    next flush. Returns the number of visits moved, or None when another
+    flush is running.
+    """
+    if not cache.add(VISITOR_COUNTS_FLUSH_LOCK_KEY, 1, VISITOR_COUNTS_FLUSH_LOCK_SECONDS):
+        return None
+    try:
+        now = now or timezone.now()
+        keys = _counter_keys(now)
+        counts = {key: visits for key, visits in cache.get_many(keys).items() if visits}
+        with transaction.atomic():
+            for key, visits in counts.items():
+                add_hourly_visits(*keys[key], visits)
+        for key, visits in counts.items():
+            try:
+                cache.decr(key, visits)
+            except ValueError:
+                pass
+        cache.set(VISITOR_COUNTS_FLUSHED_KEY, hour_start(now), None)
+        # Counted only once, under the per-type total
+        return sum(visits for key, visits in counts.items() if not keys[key][2])
+    finally:
+        cache.delete(VISITOR_COUNTS_FLUSH_LOCK_KEY)
+
+
+def pending_visitor_counts(now=None):
+    """
+    Per-type visits still waiting in the cache, as
+    ``{(hour, visitor_type): visits}``.
+    """
+    keys = {}
+    for hour in _pending_hours(now or timezone.now()):
+        for visitor_type, _ in VisitorLog.VISITOR_TYPES:
+            keys[_count_key(hour, visitor_type)] = (hour, visitor_type)
+    return {keys[key]: visits for key, visits in cache.get_many(keys).items() if visits}
+
@@ -1,3 +1,12 @@
+// Same ranking /api/orders/ sorts by
+const ORDER_STATUS_PRIORITY = {
+    new: 1,
+    in_progress: 2,
+    pending: 3,
+    cancelled: 4,
+    completed: 5,
+};
+
 class ManagerDashboard {
     constructor() {
         this.authToken = localStorage.getItem('managerToken');
@@ -280,7 +289,7 @@ class ManagerDashboard {
           // Login successful
           this.authToken = data.token;
           localStorage.setItem('managerToken', this.authToken);
-          document.cookie = `manager_token=${this.authToken}; path=/; SameSite=Lax; Secure`;
+          this.setTokenCookie();
           this.isAuthenticated = true;
 
           // Update UI
@@ -317,6 +326,12 @@ class ManagerDashboard {
       }
 
       // Perform client-side cleanup
+      if (this._stopOrderUpdates) {
+          this._stopOrderUpdates();
+      }
+      this.clearTokenCookie();
+      this.ordersCursor = null;
+      this.orderCounts = null;
       localStorage.removeItem('managerToken');
       this.authToken = null;
       this.isAuthenticated = false;
@@ -372,12 +387,46 @@ async fetchCategories() {
   }
 }
 
+  // Fetch only orders changed since the last call; the first call (no
+  // cursor yet) loads the first page of the board
   async fetchOrders() {
-    const data = await this.apiCall('/orders/')
+    if (!this.ordersCursor) {
+      return this.reloadOrders()
+    }
+    const data = await this.apiCall(`/orders/?updated_since=${encodeURIComponent(this.ordersCursor)}`)
+    if (data?.reset) {
+      // Too far behind for a delta; start over from the first page
+      return this.reloadOrders()
+    }
     if (data) {
-      this.orders = data.results || data
-      this.renderOrders()
-      this.updateStats()
+      this.ordersCursor = data.cursor
+      this.orderCounts = data.counts
+      this.mergeOrders(data.results, data.archived)
+    }
+  }
+
+  async reloadOrders() {
+    this.orders = []
+    await this.fetchOrderPage('/orders/')
+  }
+
+  async loadMoreOrders() {
+    if (this.ordersNext) {
+      await this.fetchOrderPage(this.ordersNext)
+    }
+  }
+
+  async fetchOrderPage(endpoint) {
+    const data = await this.apiCall(endpoint)
+    if (data) {
+      // Keep the first page's cursor so deltas cover everything loaded since
+      if (endpoint === '/orders/') {
+        this.ordersCursor = data.cursor
+      }
+      this.orderCounts = data.counts
+      this.ordersNext = data.next ? new URL(data.next).href.replace(`${window.location.origin}/api`, '') : null
+      document.getElementById('load-more-orders')?.classList.toggle('hidden', !this.ordersNext)
+      this.mergeOrders(data.results)
     }
   }
 
@@ -594,8 +643,27 @@ async fetchCategories() {
     })
     
     if (data) {
+      this.mergeOrders([data])
+    }
+  }
+
+  // Archive every loaded completed/cancelled order in one request
+  async archiveFinishedOrders() {
+    const ids = this.orders
+      .filter((order) => order.status === 'completed' || order.status === 'cancelled')
+      .map((order) => order.id)
+    if (!ids.length) {
+      this.showToast('No finished orders to archive.', 'warning')
+      return
+    }
+
+    const data = await this.apiCall('/orders/bulk_status/', {
+      method: 'POST',
+      body: JSON.stringify({ ids, status: 'archived' })
+    })
+    if (data) {
+      this.showToast(`Archived ${data.updated} of ${ids.length} orders.`, 'success')
       await this.fetchOrders()
-      this.updateStats()
     }
   }
 
@@ -757,8 +825,8 @@ async fetchCategories() {
                 this.setupOrderManagement(); // Start auto-refresh
             } else {
                 // Stop auto-refresh when leaving orders section
-                if (this._stopOrderInterval) {
-                    this._stopOrderInterval();
+                if (this._stopOrderUpdates) {
+                    this._stopOrderUpdates();
                 }
             }
         });
@@ -837,7 +905,7 @@ async fetchCategories() {
         card.className = "menu-item-card";
 
         card.innerHTML = `
-        <img src="${item.image_url || 'https://plakarestaurant.ca/wp-content/themes/twentytwentythree-child/img/food-placeholder.png'}" alt="${item.name}" />
+        <img src="${item.image || 'https://plakarestaurant.ca/wp-content/themes/twentytwentythree-child/img/food-placeholder.png'}" alt="${item.name}" />
         <div class="menu-item-info">
             <h4>${item.name}</h4>
             <p>${item.description || ""}</p>
@@ -1112,7 +1180,7 @@ async fetchCategories() {
             document.getElementById("item-description-input").value = item.description
             select.value = item.category_details ? item.category_details.id : ""
             document.getElementById("item-available-input").checked = item.is_available
-            previewImg.src = item.image_url
+            previewImg.src = item.image
             preview.classList.remove("hidden")
             this.editingItemId = item.id
         } else {
@@ -1250,9 +1318,12 @@ async fetchCategories() {
     })
 
     const dailySales = todayOrders.reduce((sum, order) => sum + parseFloat(order.total_price), 0)
-    const activeOrders = this.orders.filter((order) => 
-      order.status === 'pending' || order.status === 'in_progress' || order.status === 'new'
-    ).length
+    // Only part of the board may be loaded; prefer the server's counts
+    const activeOrders = this.orderCounts
+      ? this.orderCounts.new + this.orderCounts.pending + this.orderCounts.in_progress
+      : this.orders.filter((order) =>
+          order.status === 'pending' || order.status === 'in_progress' || order.status === 'new'
+        ).length
 
     document.getElementById("active-orders-count").textContent = activeOrders
     document.getElementById("todays-revenue").textContent = `ETB${dailySales.toFixed(2)}`
@@ -1392,6 +1463,9 @@ async fetchCategories() {
   }
 
   setupOrderManagement() {
+    // Orders arrive by long-polling /api/orders/events/, which answers as
+    // soon as something changes (or after ~20 seconds with nothing);
+    // polling every 30 seconds only runs while that fails
     const startInterval = () => {
         if (this.orderRefreshInterval) return; // Prevent multiple intervals
 
@@ -1409,13 +1483,74 @@ async fetchCategories() {
           }
       };
 
+      const handleEvent = (event) => {
+          const order = event.order;
+          const previous = this.orders.find((existing) => existing.id === order.id);
+          this.adjustOrderCounts(event.type === 'order_created' ? null : previous?.status, order.status);
+          this.mergeOrders([order]);
+          if (event.type === 'order_created') {
+              this.showToast(`New order from table ${order.table_number}`, 'success');
+          }
+      };
+
+      const openEventPoll = () => {
+          if (this.orderEventPoll) return;
+          const controller = new AbortController();
+          this.orderEventPoll = controller;
+
+          const poll = async () => {
+              while (!controller.signal.aborted) {
+                  const resume = this.lastOrderEventId ? `?last_event_id=${this.lastOrderEventId}` : '';
+                  let data;
+                  try {
+                      const response = await fetch(`${window.location.origin}/api/orders/events/${resume}`, {
+                          headers: { 'Authorization': `Token ${this.authToken}` },
+                          signal: controller.signal
+                      });
+                      if (response.status === 401) {
+                          // Leave it to the fallback poll to show the login form
+                          startInterval();
+                          if (this.orderEventPoll === controller) this.orderEventPoll = null;
+                          return;
+                      }
+                      if (!response.ok) throw new Error(`API error: ${response.status}`);
+                      data = await response.json();
+                  } catch (error) {
+                      if (controller.signal.aborted) return;
+                      startInterval();
+                      await new Promise((resolve) => setTimeout(resolve, 3000));
+                      continue;
+                  }
+
+                  stopInterval();
+                  this.lastOrderEventId = data.last_event_id;
+                  if (data.reset) {
+                      // Too far behind for the server to replay
+                      await this.reloadOrders();
+                  } else {
+                      data.events.forEach(handleEvent);
+                  }
+              }
+          };
+          poll();
+      };
+
+      const closeEventPoll = () => {
+          if (this.orderEventPoll) {
+              this.orderEventPoll.abort();
+              this.orderEventPoll = null;
+          }
+      };
+
       // Save functions so we can use them in event listeners or elsewhere
-      this._startOrderInterval = startInterval;
-      this._stopOrderInterval = stopInterval;
+      this._stopOrderUpdates = () => {
+          closeEventPoll();
+          stopInterval();
+      };
 
-      // Start interval if currently in the orders section
+      // Start updates if currently in the orders section
       if (this.currentSection === 'orders') {
-          startInterval();
+          openEventPoll();
       }
 
       // Set up visibility change handler once
@@ -1423,14 +1558,52 @@ async fetchCategories() {
           document.addEventListener('visibilitychange', () => {
               if (this.currentSection === 'orders') {
                   if (document.hidden) {
-                      stopInterval();
+                      this._stopOrderUpdates();
                   } else {
-                      startInterval();
+                      this.fetchOrders();
+                      openEventPoll();
                   }
               }
           });
           this._hasVisibilityHandler = true;
       }
+
+      if (!this._hasLoadMoreHandler) {
+          document.getElementById('load-more-orders')?.addEventListener('click', () => this.loadMoreOrders());
+          document.getElementById('archive-finished-orders')?.addEventListener('click', () => this.archiveFinishedOrders());
+          this._hasLoadMoreHandler = true;
+      }
+  }
+
+  // Insert or replace changed orders and drop archived ones, keeping the
+  // list in the same order as /api/orders/
+  mergeOrders(orders, archivedIds = []) {
+      const changed = new Set([...orders.map((order) => order.id), ...archivedIds]);
+      this.orders = this.orders.filter((existing) => !changed.has(existing.id));
+      this.orders.push(...orders.filter((order) => order.status !== 'archived'));
+      this.orders.sort((a, b) =>
+          (ORDER_STATUS_PRIORITY[a.status] || 6) - (ORDER_STATUS_PRIORITY[b.status] || 6) ||
+          new Date(b.created_at) - new Date(a.created_at)
+      );
+      this.renderOrders();
+      this.updateStats();
+  }
+
+  // Keep the server's per-status counts current between polls
+  adjustOrderCounts(previousStatus, status) {
+      if (!this.orderCounts || previousStatus === status) return;
+      if (previousStatus in this.orderCounts) this.orderCounts[previousStatus]--;
+      if (status in this.orderCounts) this.orderCounts[status]++;
+  }
+
+  setTokenCookie() {
+      if (this.authToken) {
+          document.cookie = `manager_token=${this.authToken}; path=/; SameSite=Lax; Secure`;
+      }
+  }
+
+  clearTokenCookie() {
+      document.cookie = 'manager_token=; path=/; max-age=0; SameSite=Lax; Secure';
   }
 }
 
@@ -13,6 +13,7 @@ let currentTableNumber = null
 
 // API Base URL
 const API_BASE_URL = window.location.origin + '/api';
+const FALLBACK_IMAGE_URL = 'https://plakarestaurant.ca/wp-content/themes/twentytwentythree-child/img/food-placeholder.png';
 
 // Track active API requests
 let activeRequests = 0;
@@ -40,10 +41,8 @@ const itemModalAddBtn = document.getElementById("item-modal-add-btn")
     // Extract table UUID from URL
     const urlParams = new URLSearchParams(window.location.search);
     currentTableUUID = urlParams.get('table_uuid');
-    if (currentTableUUID) {
-      fetchMenuByUUID(currentTableUUID);
-    } else {
-      fetchMenu();
+    if (!loadInitialMenu()) {
+      syncMenu();
     }
     
     setupEventListeners()
@@ -127,13 +126,202 @@ async function apiCall(url, options = {}) {
     }
 }
 
+  // Hydrate from the menu embedded in the page, if the server provided one
+  function loadInitialMenu() {
+      const initialMenu = document.getElementById('initial-menu');
+      if (!initialMenu) return false;
+
+      try {
+          applyMenuData(JSON.parse(initialMenu.textContent));
+      } catch (error) {
+          console.error('Error reading embedded menu:', error);
+          return false;
+      }
+      storeMenu(menuData);
+      return true;
+  }
+
+  function fetchFullMenu() {
+      if (currentTableUUID) {
+          return fetchMenuByUUID(currentTableUUID);
+      }
+      return fetchMenu();
+  }
+
+  // Offline copy of the menu in IndexedDB, stamped with its menu version
+  const MENU_DB_NAME = 'digital-menu';
+  const MENU_STORE = 'menu';
+  const MENU_VERSION_COOKIE = 'menu_version';
+
+  function openMenuDB() {
+      return new Promise((resolve, reject) => {
+          if (!window.indexedDB) {
+              reject(new Error('IndexedDB is not available'));
+              return;
+          }
+          const request = indexedDB.open(MENU_DB_NAME, 1);
+          request.onupgradeneeded = () => request.result.createObjectStore(MENU_STORE);
+          request.onsuccess = () => resolve(request.result);
+          request.onerror = () => reject(request.error);
+      });
+  }
+
+  async function loadStoredMenu() {
+      try {
+          const db = await openMenuDB();
+          return await new Promise((resolve, reject) => {
+              const request = db.transaction(MENU_STORE).objectStore(MENU_STORE).get('current');
+              request.onsuccess = () => resolve(request.result || null);
+              request.onerror = () => reject(request.error);
+          });
+      } catch (error) {
+          console.error('Error reading offline menu:', error);
+          return null;
+      }
+  }
+
+  async function storeMenu(data) {
+      // Only full menus can be patched with deltas later
+      if (data.lazy || !data.version) return;
+
+      try {
+          const db = await openMenuDB();
+          const { table_number, ...menu } = data;
+          db.transaction(MENU_STORE, 'readwrite').objectStore(MENU_STORE).put(menu, 'current');
+          // Tells the server it can skip embedding the menu in the page
+          document.cookie = `${MENU_VERSION_COOKIE}=${data.version}; path=/; max-age=${60 * 60 * 24 * 30}; SameSite=Lax`;
+      } catch (error) {
+          console.error('Error saving offline menu:', error);
+      }
+  }
+
+  // Replace changed rows in place, drop removed ones and append new ones
+  function mergeRows(rows, changed, removed) {
+      const changedById = new Map(changed.map(row => [row.id, row]));
+      const removedIds = new Set(removed);
+      const merged = rows
+          .filter(row => !removedIds.has(row.id))
+          .map(row => changedById.get(row.id) || row);
+      const known = new Set(merged.map(row => row.id));
+      return merged.concat(changed.filter(row => !known.has(row.id)));
+  }
+
+  // Show the offline copy at once, then fetch only what changed since it
+  async function syncMenu() {
+      const stored = await loadStoredMenu();
+      if (!stored) {
+          document.cookie = `${MENU_VERSION_COOKIE}=; path=/; max-age=0`;
+          return fetchFullMenu();
+      }
+      applyMenuData(stored);
+
+      let url = `${API_BASE_URL}/menu/changes/?since=${stored.version}`;
+      if (currentTableUUID) {
+          url += `&table_uuid=${encodeURIComponent(currentTableUUID)}`;
+      }
+
+      try {
+          const response = await fetch(url);
+          if (response.status === 404) {
+              showToast('Invalid QR code. Please scan a valid QR code.');
+              return;
+          }
+          if (!response.ok) {
+              throw new Error(`API error: ${response.status}`);
+          }
+          const changes = await response.json();
+          if (changes.reset) {
+              return fetchFullMenu();
+          }
+
+          applyMenuData({
+              ...stored,
+              table_number: changes.table_number,
+              version: changes.version,
+              categories: mergeRows(stored.categories, changes.categories, changes.removed_categories),
+              menu_items: mergeRows(stored.menu_items, changes.menu_items, changes.removed_items),
+          });
+          storeMenu(menuData);
+      } catch (error) {
+          // Offline: keep showing the stored copy
+          console.error('Error syncing menu:', error);
+      }
+  }
+
+  // Render a full menu, or a lazy category index whose items are streamed in
+  function applyMenuData(data) {
+      menuData = data;
+      if (data.table_number) {
+          currentTableNumber = data.table_number;
+          document.title = `Table ${currentTableNumber} - TK-Brown Coffee`;
+      }
+      if (data.lazy) {
+          menuData.menu_items = [];
+      }
+      renderCategories();
+      renderMenuItems();
+      if (data.lazy) {
+          streamCategoryItems(data.categories);
+      }
+  }
+
+  // Categories still waiting for their items, loaded one at a time in order
+  let pendingCategories = [];
+
+  async function streamCategoryItems(categories) {
+      pendingCategories = categories
+          .filter(category => category.item_count > 0)
+          .map(category => category.id.toString());
+      prioritizeCategory(activeCategory);
+
+      while (pendingCategories.length) {
+          await loadCategoryItems(pendingCategories.shift());
+      }
+  }
+
+  // Move the category the customer is looking at to the front of the queue
+  function prioritizeCategory(categoryId) {
+      const index = pendingCategories.indexOf(categoryId);
+      if (index > 0) {
+          pendingCategories.splice(index, 1);
+          pendingCategories.unshift(categoryId);
+      }
+  }
+
+  async function loadCategoryItems(categoryId) {
+      let cursor = 0;
+      do {
+          try {
+              const response = await fetch(`${API_BASE_URL}/menu/categories/${categoryId}/items/?cursor=${cursor}`);
+              if (!response.ok) {
+                  throw new Error(`API error: ${response.status}`);
+              }
+              const page = await response.json();
+              mergeMenuItems(page.menu_items);
+              cursor = page.next_cursor;
+              // Leave server-side search results on screen until cleared
+              if (!searchBar.value) {
+                  renderMenuItems();
+              }
+          } catch (error) {
+              console.error('Error loading category items:', error);
+              return;
+          }
+      } while (cursor);
+  }
+
+  // Add items not seen yet; search results and streamed pages can overlap
+  function mergeMenuItems(items) {
+      const known = new Set(menuData.menu_items.map(item => item.id));
+      menuData.menu_items.push(...items.filter(item => !known.has(item.id)));
+  }
+
   // API Functions
   async function fetchMenu() {
       try {
           const data = await apiCall(`${API_BASE_URL}/menu/`);
-          menuData = data;
-          renderCategories();
-          renderMenuItems();
+          applyMenuData(data);
+          storeMenu(data);
       } catch (error) {
           console.error('Error fetching menu:', error);
       }
@@ -142,26 +330,38 @@ async function apiCall(url, options = {}) {
   async function fetchMenuByUUID(uuid) {
       try {
           const data = await apiCall(`${API_BASE_URL}/menu/${uuid}/`);
-          menuData = data;
-          currentTableNumber = data.table_number;
-          renderCategories();
-          renderMenuItems();
-          
-          // Update page title with table number
-          document.title = `Table ${currentTableNumber} - TK-Brown Coffee`;
+          applyMenuData(data);
+          storeMenu(data);
       } catch (error) {
           console.error('Error fetching menu by UUID:', error);
           showToast('Invalid QR code. Please scan a valid QR code.');
       }
   }
 
+  // One key per cart submission: repeated taps and retries reuse it so the
+  // server places the order only once
+  let pendingOrderKey = null;
+
+  function newIdempotencyKey() {
+      if (window.crypto && crypto.randomUUID) {
+          return crypto.randomUUID();
+      }
+      return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+  }
+
   async function placeOrder(orderData) {
+      if (!pendingOrderKey) {
+          pendingOrderKey = newIdempotencyKey();
+      }
       try {
-          const order = await apiCall(`${API_BASE_URL}/orders/`, {
+          // The table uuid keys the server's per-table order throttle
+          const tableParam = currentTableUUID ? `?table_uuid=${encodeURIComponent(currentTableUUID)}` : '';
+          const order = await apiCall(`${API_BASE_URL}/orders/${tableParam}`, {
               method: 'POST',
               headers: {
                   'Content-Type': 'application/json',
-                  'X-CSRFToken': getCSRFToken()
+                  'X-CSRFToken': getCSRFToken(),
+                  'Idempotency-Key': pendingOrderKey
               },
               body: JSON.stringify(orderData)
           });
@@ -247,10 +447,36 @@ async function apiCall(url, options = {}) {
           clearSearchBtn.classList.add("hidden");
       }
 
+      // Lazily loaded menus may not hold every item yet, so ask the server
+      if (menuData.lazy && query) {
+          clearTimeout(searchTimer);
+          searchTimer = setTimeout(() => searchMenu(query), 150);
+          return;
+      }
+
       // Filter menu items based on the search query
       renderMenuItems(query);
   }
 
+  let searchTimer = null;
+
+  async function searchMenu(query) {
+      try {
+          const response = await fetch(`${API_BASE_URL}/menu/search/?q=${encodeURIComponent(query)}`);
+          if (!response.ok) {
+              throw new Error(`API error: ${response.status}`);
+          }
+          const data = await response.json();
+          // Ignore answers to queries the customer has already typed past
+          if (searchBar.value.toLowerCase() !== query) return;
+          mergeMenuItems(data.results);
+          renderMenuItems(query, data.results);
+      } catch (error) {
+          console.error('Error searching menu:', error);
+          renderMenuItems(query);
+      }
+  }
+
   // Function to clear the search input
   function clearSearch() {
       searchBar.value = "";
@@ -258,16 +484,16 @@ async function apiCall(url, options = {}) {
       renderMenuItems();  // Reset to all items
   }
 
-  function renderMenuItems(query = "") {
-      let items = menuData.menu_items || [];
+  function renderMenuItems(query = "", results = null) {
+      let items = results || menuData.menu_items || [];
 
       // Filter by category if not "all"
       if (activeCategory !== "all") {
           items = items.filter(item => item.category_details.id.toString() === activeCategory);
       }
 
-      // Filter by search query
-      if (query) {
+      // Filter by search query, unless the server already did
+      if (query && !results) {
           items = items.filter(item => item.name.toLowerCase().includes(query) || item.description.toLowerCase().includes(query));
       }
 
@@ -281,7 +507,7 @@ async function apiCall(url, options = {}) {
               <div class="menu-item ${!item.is_available ? "unavailable" : ""}"
                   style="animation-delay: ${index * 100}ms">
                   <div class="menu-item-image" data-item-id="${item.id}">
-                      <img src="${item.image_url || 'https://plakarestaurant.ca/wp-content/themes/twentytwentythree-child/img/food-placeholder.png'}" alt="${item.name}" />
+                      ${renderItemImage(item)}
                       <div class="image-overlay"></div>
                       ${!item.is_available ? '<div class="unavailable-overlay">Not Available</div>' : ""}
                   </div>
@@ -309,6 +535,18 @@ async function apiCall(url, options = {}) {
       }
   }
 
+  // Let the browser pick a width from the precomputed variants, showing the
+  // blurred placeholder until the real image arrives
+  function renderItemImage(item) {
+    const variants = item.image_variants || {}
+    if (!variants.srcset) {
+      return `<img src="${item.image || FALLBACK_IMAGE_URL}" alt="${item.name}" loading="lazy" />`
+    }
+    return `<img src="${variants.card}" srcset="${variants.srcset}"
+                 sizes="(max-width: 600px) 50vw, 300px" alt="${item.name}" loading="lazy"
+                 style="background: url('${variants.placeholder}') center / cover no-repeat" />`
+  }
+
   function renderCart() {
     if (cart.length === 0 || cart.length < 0) {
       cartButton.classList.add("hidden")
@@ -347,6 +585,7 @@ async function apiCall(url, options = {}) {
     categoryChips.addEventListener("click", (e) => {
       if (e.target.classList.contains("category-chip")) {
         activeCategory = e.target.dataset.category
+        prioritizeCategory(activeCategory)
         renderCategories()
         renderMenuItems()
       }
@@ -442,6 +681,7 @@ async function apiCall(url, options = {}) {
     try {
       const order = await placeOrder(orderData);
       showToast("Order placed successfully! Your order number is #" + order.table_number + '-' + order.id, 'success');
+      pendingOrderKey = null;
       cart = [];
       renderCart();
       cartOverlay.classList.add("hidden");
@@ -454,7 +694,8 @@ async function apiCall(url, options = {}) {
   function openItemModal(itemId) {
     const item = findItemById(itemId)
     if (!item) return 
-    itemModalImg.src = item.image_url || 'https://plakarestaurant.ca/wp-content/themes/twentytwentythree-child/img/food-placeholder.png'
+    const variants = item.image_variants || {}
+    itemModalImg.src = variants.detail || item.image || FALLBACK_IMAGE_URL
     itemModalImg.alt = item.name
     itemModalName.textContent = item.name
     itemModalDescription.textContent = item.description
@@ -471,6 +712,7 @@ async function apiCall(url, options = {}) {
     const item = findItemById(itemId)
     if (!item || !item.is_available) return
 
+    pendingOrderKey = null
     const existingItem = cart.find((cartItem) => cartItem.id === itemId)
     if (existingItem) {
       existingItem.quantity += 1
@@ -490,6 +732,7 @@ async function apiCall(url, options = {}) {
     const cartItem = cart.find((item) => item.id === itemId)
     if (!cartItem) return
 
+    pendingOrderKey = null
     cartItem.quantity += change
 
     if (cartItem.quantity <= 0) {